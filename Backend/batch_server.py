@@ -0,0 +1,89 @@
+"""
+Local stand-in for a provider batch API, for testing batch mode offline.
+
+    python -m batch_server --port 8100
+    LLM_BATCH_ENABLED=true LLM_BATCH_URL=http://127.0.0.1:8100 python -m workers
+
+Batches are answered by the mock provider (see LLM_MOCK_* settings) and kept
+in memory only.
+"""
+import argparse
+import asyncio
+import uuid
+from dataclasses import asdict
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+from config import settings
+from llm_providers import LLMProvider, MockProvider, ProviderResponse
+
+
+class BatchRequest(BaseModel):
+    model: str
+    config: dict = {}
+    prompts: list[str]
+
+
+def create_app(provider: LLMProvider, max_batch_size: int = 1000) -> FastAPI:
+    app = FastAPI(title="Foundry local batch server")
+    batches = {}
+    # The event loop only keeps weak references to tasks
+    tasks = set()
+
+    async def run(name: str, request: BatchRequest):
+        try:
+            results = await asyncio.to_thread(provider.generate_batch, request.model, request.prompts, request.config)
+            batches[name]["responses"] = [
+                asdict(result) if isinstance(result, ProviderResponse) else {"error": str(result)}
+                for result in results
+            ]
+            batches[name]["state"] = "SUCCEEDED"
+        except Exception as e:
+            batches[name]["state"] = "FAILED"
+            batches[name]["error"] = str(e)
+
+    @app.post("/v1/batches")
+    async def create_batch(request: BatchRequest):
+        if len(request.prompts) > max_batch_size:
+            raise HTTPException(status_code=400, detail=f"At most {max_batch_size} prompts per batch")
+
+        name = uuid.uuid4().hex
+        batches[name] = {"name": name, "state": "RUNNING", "size": len(request.prompts)}
+        task = asyncio.create_task(run(name, request))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return batches[name]
+
+    @app.get("/v1/batches/{name}")
+    async def get_batch(name: str):
+        if name not in batches:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        return batches[name]
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in batch server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--max-batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    # Imported here so that importing this module stays light
+    from workers import MOCK_RESPONSES
+
+    provider = MockProvider(
+        MOCK_RESPONSES,
+        latency_median=settings.LLM_MOCK_LATENCY_MEDIAN_SECONDS,
+        latency_sigma=settings.LLM_MOCK_LATENCY_SIGMA,
+        error_rate=settings.LLM_MOCK_ERROR_RATE,
+        seed=settings.LLM_MOCK_SEED
+    )
+    uvicorn.run(create_app(provider, args.max_batch_size), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
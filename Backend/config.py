@@ -9,6 +9,193 @@ load_dotenv(env_path)
 
 class Settings:
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+    # Database: DATABASE_URL wins; otherwise POSTGRES_HOST selects Postgres
+    # from the POSTGRES_* variables, and without either we fall back to the
+    # local SQLite file. The pool settings only apply to server databases.
+    POSTGRES_HOST = os.getenv("POSTGRES_HOST")
+    if os.getenv("DATABASE_URL"):
+        DATABASE_URL = os.getenv("DATABASE_URL")
+    elif POSTGRES_HOST:
+        DATABASE_URL = "postgresql+psycopg://{}:{}@{}:{}/{}".format(
+            os.getenv("POSTGRES_USER", "postgres"),
+            os.getenv("POSTGRES_PASSWORD", "password"),
+            POSTGRES_HOST,
+            os.getenv("POSTGRES_PORT", "5432"),
+            os.getenv("POSTGRES_DB", "foundry")
+        )
+    else:
+        DATABASE_URL = "sqlite:///./foundry_v2.db"
+
+    # Per process. Sized for API requests plus in-process workers; a job only
+    # holds a connection in its short database phases before and after the
+    # model call (_start_job, _finish_job), not while the model runs
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+    # Test connections on checkout and replace them before the server or a
+    # proxy drops them as idle
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+
+    # Workers are woken by upsert_job; this is only the fallback re-check
+    JOB_SWEEP_INTERVAL_SECONDS = float(os.getenv("JOB_SWEEP_INTERVAL_SECONDS", "60"))
+
+    # Set to false when workers run separately (python -m workers). A
+    # standalone worker is woken through the event broker (EVENT_BROKER);
+    # while that is in-process only, it re-checks the jobs table on its
+    # own, shorter sweep.
+    RUN_WORKERS_IN_API = os.getenv("RUN_WORKERS_IN_API", "true").lower() == "true"
+    WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+    WORKER_SWEEP_INTERVAL_SECONDS = float(os.getenv("WORKER_SWEEP_INTERVAL_SECONDS", "2"))
+
+    # Worker pool size and how many jobs of each type may run at once
+    WORKER_MAX_CONCURRENCY = int(os.getenv("WORKER_MAX_CONCURRENCY", "16"))
+    WORKER_CONCURRENCY = {
+        "founder_alignment": int(os.getenv("WORKER_CONCURRENCY_FOUNDER_ALIGNMENT", "4")),
+        "idea_analysis": int(os.getenv("WORKER_CONCURRENCY_IDEA_ANALYSIS", "4")),
+        "investor_readiness": int(os.getenv("WORKER_CONCURRENCY_INVESTOR_READINESS", "4")),
+        "dashboard": int(os.getenv("WORKER_CONCURRENCY_DASHBOARD", "4")),
+    }
+
+    # Slots per job type (and in the whole pool) that only interactive jobs
+    # may take, so a backlog of normal or background work cannot fill them
+    WORKER_INTERACTIVE_RESERVED_SLOTS = int(os.getenv("WORKER_INTERACTIVE_RESERVED_SLOTS", "1"))
+
+    # Coalescing window: a job only becomes eligible once its org has gone this
+    # many seconds without re-queueing it, but never later than the max delay
+    # after the first request. Explicit re-run requests skip the window.
+    JOB_DEBOUNCE_SECONDS = {
+        "founder_alignment": float(os.getenv("JOB_DEBOUNCE_SECONDS_FOUNDER_ALIGNMENT", "3")),
+        "idea_analysis": float(os.getenv("JOB_DEBOUNCE_SECONDS_IDEA_ANALYSIS", "5")),
+        "investor_readiness": float(os.getenv("JOB_DEBOUNCE_SECONDS_INVESTOR_READINESS", "3")),
+        "dashboard": float(os.getenv("JOB_DEBOUNCE_SECONDS_DASHBOARD", "2")),
+    }
+    JOB_MAX_DELAY_SECONDS = float(os.getenv("JOB_MAX_DELAY_SECONDS", "30"))
+
+    # Token budget per prompt; the largest input fields are trimmed to fit
+    PROMPT_TOKEN_BUDGET = {
+        "founder_alignment": int(os.getenv("PROMPT_TOKEN_BUDGET_FOUNDER_ALIGNMENT", "6000")),
+        "idea_analysis": int(os.getenv("PROMPT_TOKEN_BUDGET_IDEA_ANALYSIS", "4000")),
+        "investor_readiness": int(os.getenv("PROMPT_TOKEN_BUDGET_INVESTOR_READINESS", "4000")),
+        "dashboard": int(os.getenv("PROMPT_TOKEN_BUDGET_DASHBOARD", "6000")),
+    }
+
+    # Model routing: each job type runs on a model tier within a latency
+    # budget, and falls back to the fast tier while the p95 latency (or
+    # success rate) of its model over the last window is out of bounds.
+    # Interactive jobs get the tighter of their type's and the interactive
+    # budget; background jobs always stay on their tier.
+    LLM_MODELS = {
+        "pro": os.getenv("LLM_MODEL_PRO", "gemini-3-pro-preview"),
+        "fast": os.getenv("LLM_MODEL_FAST", "gemini-3-flash-preview"),
+    }
+    LLM_MODEL_TIER = {
+        "founder_alignment": os.getenv("LLM_MODEL_TIER_FOUNDER_ALIGNMENT", "pro"),
+        "idea_analysis": os.getenv("LLM_MODEL_TIER_IDEA_ANALYSIS", "pro"),
+        "investor_readiness": os.getenv("LLM_MODEL_TIER_INVESTOR_READINESS", "pro"),
+        # Mostly restates the upstream analyses
+        "dashboard": os.getenv("LLM_MODEL_TIER_DASHBOARD", "fast"),
+    }
+    LLM_LATENCY_BUDGET_SECONDS = {
+        "founder_alignment": float(os.getenv("LLM_LATENCY_BUDGET_SECONDS_FOUNDER_ALIGNMENT", "60")),
+        "idea_analysis": float(os.getenv("LLM_LATENCY_BUDGET_SECONDS_IDEA_ANALYSIS", "60")),
+        "investor_readiness": float(os.getenv("LLM_LATENCY_BUDGET_SECONDS_INVESTOR_READINESS", "60")),
+        "dashboard": float(os.getenv("LLM_LATENCY_BUDGET_SECONDS_DASHBOARD", "30")),
+    }
+    LLM_INTERACTIVE_LATENCY_BUDGET_SECONDS = float(os.getenv("LLM_INTERACTIVE_LATENCY_BUDGET_SECONDS", "20"))
+    LLM_ROUTING_WINDOW_SECONDS = float(os.getenv("LLM_ROUTING_WINDOW_SECONDS", "600"))
+    LLM_ROUTING_MIN_SAMPLES = int(os.getenv("LLM_ROUTING_MIN_SAMPLES", "5"))
+    LLM_ROUTING_MIN_SUCCESS_RATE = float(os.getenv("LLM_ROUTING_MIN_SUCCESS_RATE", "0.8"))
+
+    # Monte Carlo runway simulation (runway_sim); seeded so that the same
+    # financials always give the same distribution
+    RUNWAY_SIMULATION_PATHS = int(os.getenv("RUNWAY_SIMULATION_PATHS", "20000"))
+    RUNWAY_SIMULATION_HORIZON_MONTHS = int(os.getenv("RUNWAY_SIMULATION_HORIZON_MONTHS", "36"))
+    RUNWAY_SIMULATION_SEED = int(os.getenv("RUNWAY_SIMULATION_SEED", "0"))
+
+    # Job leases: a claimed job is reclaimable once its lease lapses (e.g. the
+    # worker process died); running jobs renew their lease on every sweep
+    JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    # A failed job waits base * 2^(attempt - 1) seconds, up to the max,
+    # before it is retried
+    JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+    JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "300"))
+
+    # Job status history: rows are dropped once finished for the TTL, and the
+    # oldest finished rows go first when the table outgrows its cap
+    JOB_STATUS_TTL_SECONDS = float(os.getenv("JOB_STATUS_TTL_SECONDS", str(24 * 3600)))
+    JOB_STATUS_MAX_ROWS = int(os.getenv("JOB_STATUS_MAX_ROWS", "10000"))
+    JOB_STATUS_CLEANUP_INTERVAL_SECONDS = float(os.getenv("JOB_STATUS_CLEANUP_INTERVAL_SECONDS", "300"))
+
+    # "threads" runs each job on a pool thread; "async" awaits model calls on
+    # one event loop, so the limits above can be raised without adding threads
+    WORKER_EXECUTION_MODE = os.getenv("WORKER_EXECUTION_MODE", "threads")
+    LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "200"))
+    ASYNC_DB_THREADS = int(os.getenv("ASYNC_DB_THREADS", "4"))
+
+    # Persistent cache of model responses, keyed by (model, prompt, config)
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+    # Gemini quota and retry policy for 429s and transient errors. The
+    # limiter lives in each process: python -m workers --processes N splits
+    # the quota between its processes, but API processes running their own
+    # workers (uvicorn --workers N with RUN_WORKERS_IN_API) each get all of it.
+    LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+    LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+    LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "2000"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+    LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+    LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "60"))
+
+    # Job event delivery to SSE streams and WebSockets: "memory" reaches only
+    # this process; "redis" (needs the redis package) reaches all of them
+    EVENT_BROKER = os.getenv("EVENT_BROKER", "memory")
+    EVENT_BROKER_URL = os.getenv("EVENT_BROKER_URL", "redis://localhost:6379/0")
+    EVENT_BROKER_CHANNEL = os.getenv("EVENT_BROKER_CHANNEL", "foundry:events")
+    # While the broker is unreachable, events fall back to "memory" and the
+    # connection is retried this often
+    EVENT_BROKER_RETRY_SECONDS = float(os.getenv("EVENT_BROKER_RETRY_SECONDS", "30"))
+    # Partial model output is sent as deltas, at most this often per job
+    EVENT_PARTIAL_MIN_INTERVAL_SECONDS = float(os.getenv("EVENT_PARTIAL_MIN_INTERVAL_SECONDS", "0.25"))
+
+    # Model backend: "gemini", "mock" (canned samples, no network), "record"
+    # (Gemini, saving each response as a cassette) or "replay" (cassettes only)
+    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+    LLM_CASSETTE_DIR = os.getenv("LLM_CASSETTE_DIR", os.path.join(base_dir, "cassettes"))
+    LLM_MOCK_LATENCY_MEDIAN_SECONDS = float(os.getenv("LLM_MOCK_LATENCY_MEDIAN_SECONDS", "2"))
+    LLM_MOCK_LATENCY_SIGMA = float(os.getenv("LLM_MOCK_LATENCY_SIGMA", "0.5"))
+    LLM_MOCK_ERROR_RATE = float(os.getenv("LLM_MOCK_ERROR_RATE", "0"))
+    LLM_MOCK_SEED = int(os.getenv("LLM_MOCK_SEED")) if os.getenv("LLM_MOCK_SEED") else None
+
+    # Batch mode: background jobs of one type are sent as a single provider
+    # batch once at least LLM_BATCH_MIN_SIZE of them are ready. LLM_BATCH_URL
+    # points batches at a batch server, e.g. python -m batch_server
+    LLM_BATCH_ENABLED = os.getenv("LLM_BATCH_ENABLED", "false").lower() == "true"
+    LLM_BATCH_MIN_SIZE = int(os.getenv("LLM_BATCH_MIN_SIZE", "10"))
+    LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "500"))
+    LLM_BATCH_MAX_CONCURRENT = int(os.getenv("LLM_BATCH_MAX_CONCURRENT", "2"))
+    LLM_BATCH_POLL_SECONDS = float(os.getenv("LLM_BATCH_POLL_SECONDS", "10"))
+    LLM_BATCH_URL = os.getenv("LLM_BATCH_URL")
+
+    # Request profiling (opt-in): per-request timings in a Server-Timing header
+    # and a ring buffer at /api/v1/admin/profiles. A request with the header
+    # "PROFILING_HEADER: cpu" also gets a sampled CPU profile. When
+    # PROFILING_ADMIN_TOKEN is set, both need it in X-Admin-Token.
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_BUFFER_SIZE = int(os.getenv("PROFILING_BUFFER_SIZE", "200"))
+    PROFILING_SLOW_QUERY_SECONDS = float(os.getenv("PROFILING_SLOW_QUERY_SECONDS", "0.1"))
+    PROFILING_HEADER = os.getenv("PROFILING_HEADER", "X-Profile")
+    PROFILING_SAMPLE_INTERVAL_SECONDS = float(os.getenv("PROFILING_SAMPLE_INTERVAL_SECONDS", "0.005"))
+    PROFILING_TOP_STACKS = int(os.getenv("PROFILING_TOP_STACKS", "30"))
+    PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN")
+
+    # Keep-alive pool of the shared Gemini client
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "300"))
     
     @staticmethod
     def validate():
@@ -0,0 +1,279 @@
+import asyncio
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+from fastapi import WebSocket
+from fastapi.responses import StreamingResponse
+
+from config import settings
+
+
+class Subscription:
+    """
+    One listener (e.g. an open SSE response) on an org's events. Events are
+    handed over to the listener's own event loop, so publishers can be
+    worker threads.
+    """
+
+    def __init__(self, org_id: str, job_type: str | None, loop: asyncio.AbstractEventLoop, partial: bool = True):
+        self.org_id = org_id
+        self.job_type = job_type
+        self.partial = partial
+        self.queue = asyncio.Queue()
+        self._loop = loop
+
+    def wants(self, job_type: str, event: str) -> bool:
+        if self.job_type and job_type != self.job_type:
+            return False
+        return self.partial or event != "partial"
+
+    def deliver(self, event: dict):
+        if not self.wants(event.get("type"), event.get("event")):
+            return
+        try:
+            self._loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        except RuntimeError:
+            pass  # Listener's loop has shut down
+
+
+class InMemoryBroker:
+    """
+    Delivers events within this process only.
+    """
+    cross_process = False
+
+    def start(self, handler: Callable[[dict], None]):
+        self._handler = handler
+
+    def publish(self, message: dict):
+        self._handler(message)
+
+
+class RedisBroker:
+    """
+    Fans events out to every process through Redis pub/sub, so API processes
+    hear about jobs run by standalone workers. Needs the redis package.
+    """
+    cross_process = True
+
+    def __init__(self, url: str, channel: str):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self.channel = channel
+
+    def start(self, handler: Callable[[dict], None]):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: lambda item: handler(json.loads(item["data"]))})
+        pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def publish(self, message: dict):
+        self._redis.publish(self.channel, json.dumps(message, default=str))
+
+
+def create_broker():
+    if settings.EVENT_BROKER == "redis":
+        return RedisBroker(settings.EVENT_BROKER_URL, settings.EVENT_BROKER_CHANNEL)
+    return InMemoryBroker()
+
+
+class EventBus:
+    """
+    Publish/subscribe of job events, keyed by org. Events go through the
+    broker, which hands them back to the bus of every process it reaches.
+    """
+
+    def __init__(self, broker=None):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self._listeners = []
+        self._broker = broker
+        self._broker_lock = threading.Lock()
+        # While the configured broker is unreachable, events stay in this
+        # process; connecting is retried once this monotonic time has passed
+        self._retry_broker_at = None
+
+    def _broker_due(self) -> bool:
+        return self._broker is None or (
+            self._retry_broker_at is not None and time.monotonic() >= self._retry_broker_at
+        )
+
+    def _get_broker(self):
+        # Created on first use, so importing this module never connects anywhere
+        if self._broker_due():
+            with self._broker_lock:
+                if self._broker_due():
+                    try:
+                        broker = create_broker()
+                        broker.start(self._deliver)
+                        self._retry_broker_at = None
+                    except Exception as e:
+                        # Like publishing, delivery is best effort: never fail
+                        # a job or a stream because the broker is down
+                        print("Event broker unavailable, delivering in this process only:", str(e))
+                        broker = InMemoryBroker()
+                        broker.start(self._deliver)
+                        self._retry_broker_at = time.monotonic() + settings.EVENT_BROKER_RETRY_SECONDS
+                    self._broker = broker
+        return self._broker
+
+    def publish(self, org_id: str, job_type: str, event: str, **data):
+        message = {"type": job_type, "org_id": org_id, "event": event, **data}
+        try:
+            self._get_broker().publish(message)
+        except Exception as e:
+            # Notifications are best effort; never fail a job over them
+            print("Event publish failed:", str(e))
+
+    @property
+    def cross_process(self) -> bool:
+        """
+        Whether events currently reach every process, i.e. the configured
+        broker is cross-process and reachable.
+        """
+        return self._get_broker().cross_process
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        """
+        Calls listener with every event this process receives, for any org,
+        including events published by other processes. It runs on the
+        broker's thread, so it must be quick and must not block.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+        self._get_broker()
+
+    def _deliver(self, message: dict):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(message.get("org_id"), ()))
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(message)
+            except Exception as e:
+                print("Event listener failed:", str(e))
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+    def has_subscribers(self, org_id: str, job_type: str | None = None, event: str = "partial") -> bool:
+        # Listeners in other processes are invisible from here; assume one
+        if self.cross_process:
+            return True
+        with self._lock:
+            return any(
+                not job_type or s.wants(job_type, event)
+                for s in self._subscriptions.get(org_id, ())
+            )
+
+    @contextmanager
+    def subscribe(self, org_id: str, job_type: str | None = None, partial: bool = True):
+        """
+        Must be entered from a running event loop.
+        """
+        self._get_broker()
+        subscription = Subscription(org_id, job_type, asyncio.get_running_loop(), partial=partial)
+        with self._lock:
+            self._subscriptions.setdefault(org_id, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                subscriptions = self._subscriptions.get(org_id)
+                if subscriptions:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._subscriptions[org_id]
+
+
+event_bus = EventBus()
+
+
+def format_sse(message: dict) -> str:
+    return f"event: {message['event']}\ndata: {json.dumps(message, default=str)}\n\n"
+
+
+async def sse_events(org_id: str, job_type: str, count_pending: Callable[[], int], heartbeat_seconds: float = 15):
+    """
+    Server-Sent Events stream of one analysis type for an org: a snapshot
+    first, then job state changes and partial model output as they happen.
+    """
+    with event_bus.subscribe(org_id, job_type) as subscription:
+        # Counted after subscribing, so an event published in between is
+        # still delivered after the snapshot rather than lost
+        size = await asyncio.to_thread(count_pending)
+        yield format_sse({"type": job_type, "org_id": org_id, "event": "snapshot", "size": size})
+
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat_seconds)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+
+            yield format_sse(message)
+
+
+def sse_response(org_id: str, job_type: str, count_pending: Callable[[], int]) -> StreamingResponse:
+    """
+    count_pending returns the number of pending jobs, as in the matching GET
+    endpoint. It must open its own short-lived session: a request-scoped one
+    would hold a pooled connection for as long as the stream stays open.
+    """
+    return StreamingResponse(
+        sse_events(org_id, job_type, count_pending),
+        media_type="text/event-stream",
+        # Disable caching and proxy buffering so events arrive as they are sent
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class WebSocketHub:
+    """
+    Open WebSockets per org. Each org with at least one socket holds a
+    single bus subscription, and every message on it is sent to all of the
+    org's sockets. Partial model output is left to the SSE streams.
+    """
+
+    def __init__(self):
+        self._sockets = {}
+        self._pumps = {}
+
+    async def connect(self, org_id: str, websocket: WebSocket):
+        await websocket.accept()
+        self._sockets.setdefault(org_id, set()).add(websocket)
+        if org_id not in self._pumps:
+            self._pumps[org_id] = asyncio.create_task(self._pump(org_id))
+
+    def disconnect(self, org_id: str, websocket: WebSocket):
+        sockets = self._sockets.get(org_id)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if sockets:
+                return
+            del self._sockets[org_id]
+
+        pump = self._pumps.pop(org_id, None)
+        if pump:
+            pump.cancel()
+
+    def connection_count(self) -> int:
+        return sum(len(sockets) for sockets in self._sockets.values())
+
+    async def _pump(self, org_id: str):
+        with event_bus.subscribe(org_id, partial=False) as subscription:
+            while True:
+                message = await subscription.queue.get()
+                text = json.dumps(message, default=str)
+
+                sockets = list(self._sockets.get(org_id, ()))
+                results = await asyncio.gather(*(ws.send_text(text) for ws in sockets), return_exceptions=True)
+                for websocket, result in zip(sockets, results):
+                    if isinstance(result, Exception):
+                        self.disconnect(org_id, websocket)
+
+
+hub = WebSocketHub()
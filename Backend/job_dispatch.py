@@ -0,0 +1,41 @@
+import threading
+
+from config import settings
+
+
+class JobDispatcher:
+    """
+    In-process notification channel between upsert_job and the worker
+    scheduler.
+
+    upsert_job announces new work right after its row is committed, and
+    finished jobs announce a free slot, which wakes the scheduler
+    immediately. Jobs queued by other processes are announced through the
+    event broker (see workers.start_workers). When nothing is announced the
+    scheduler still re-checks the jobs table once per sweep interval, so
+    jobs whose announcement was lost (or came before the scheduler started)
+    are still picked up.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def notify(self):
+        self._event.set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Blocks until work is announced or the sweep interval elapses.
+        Returns True when woken by a notification.
+        """
+        if timeout is None:
+            timeout = settings.JOB_SWEEP_INTERVAL_SECONDS
+
+        woken = self._event.wait(timeout)
+        # Clearing after the wait is safe: notify() always runs after the
+        # commit, so the query that follows will see the announced job.
+        self._event.clear()
+        return woken
+
+
+dispatcher = JobDispatcher()
@@ -0,0 +1,112 @@
+import datetime
+import hashlib
+import json
+import threading
+
+from sqlalchemy import func
+
+from config import settings
+from database import SessionLocal
+from models import LLMCacheEntry
+
+
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _count(name: str, n: int = 1):
+    with _lock:
+        _counters[name] += n
+
+
+def cache_key(model: str, prompt: str, config: dict) -> str:
+    """
+    Content address of a model call: identical model, prompt and generation
+    config always map to the same key.
+    """
+    payload = json.dumps({"model": model, "prompt": prompt, "config": config}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cached(key: str) -> dict | None:
+    db = SessionLocal()
+    try:
+        now = datetime.datetime.utcnow()
+        entry = db.query(LLMCacheEntry).filter_by(key=key).first()
+        if not entry or entry.expires_at < now:
+            _count("misses")
+            return None
+
+        entry.last_accessed_at = now
+        entry.hits = (entry.hits or 0) + 1
+        db.commit()
+
+        _count("hits")
+        return json.loads(entry.response)
+    finally:
+        db.close()
+
+
+def store_cached(key: str, model: str, response: dict):
+    text = json.dumps(response)
+    now = datetime.datetime.utcnow()
+
+    db = SessionLocal()
+    try:
+        entry = db.query(LLMCacheEntry).filter_by(key=key).first()
+        if not entry:
+            entry = LLMCacheEntry(key=key, hits=0)
+            db.add(entry)
+
+        entry.model = model
+        entry.response = text
+        entry.size_bytes = len(text.encode("utf-8"))
+        entry.created_at = now
+        entry.last_accessed_at = now
+        entry.expires_at = now + datetime.timedelta(seconds=settings.LLM_CACHE_TTL_SECONDS)
+        db.commit()
+
+        _evict(db, now)
+    except Exception as e:
+        # A cache write must never fail the job that produced the response
+        db.rollback()
+        print("LLM cache write failed:", str(e))
+    finally:
+        db.close()
+
+
+def _evict(db, now: datetime.datetime):
+    """
+    Drops expired entries, then least recently used ones until the cache
+    fits in LLM_CACHE_MAX_BYTES.
+    """
+    evicted = db.query(LLMCacheEntry).filter(LLMCacheEntry.expires_at < now).delete()
+
+    total = db.query(func.coalesce(func.sum(LLMCacheEntry.size_bytes), 0)).scalar()
+    if total > settings.LLM_CACHE_MAX_BYTES:
+        oldest = (
+            db.query(LLMCacheEntry.key, LLMCacheEntry.size_bytes)
+            .order_by(LLMCacheEntry.last_accessed_at.asc())
+            .all()
+        )
+        victims = []
+        for key, size in oldest:
+            if total <= settings.LLM_CACHE_MAX_BYTES:
+                break
+            victims.append(key)
+            total -= size or 0
+
+        evicted += db.query(LLMCacheEntry).filter(LLMCacheEntry.key.in_(victims)).delete(synchronize_session=False)
+
+    db.commit()
+    if evicted:
+        _count("evictions", evicted)
+
+
+def cache_stats() -> dict:
+    with _lock:
+        stats = dict(_counters)
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else None
+    return stats
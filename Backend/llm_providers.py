@@ -0,0 +1,392 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+import httpx
+from google.genai import errors, types
+
+from config import settings
+from llm_cache import cache_key
+from llm_client import get_client, warm_client
+from prompt_builder import estimate_tokens
+
+
+@dataclass
+class ProviderResponse:
+    text: str
+    total_tokens: int | None = None
+    prompt_tokens: int | None = None
+    # Everything billed as output, including any thinking tokens
+    response_tokens: int | None = None
+
+
+class LLMProvider:
+    """
+    Turns a prompt into the model's raw response text. Caching, rate
+    limiting, retries and JSON parsing stay in query_model, so every provider
+    goes through the same pipeline.
+
+    on_partial, when given, is called with the text received so far.
+    """
+    name = "base"
+
+    def generate(self, model: str, prompt: str, config: dict,
+                 on_partial: Callable[[str], None] | None = None) -> ProviderResponse:
+        raise NotImplementedError
+
+    async def generate_async(self, model: str, prompt: str, config: dict,
+                             on_partial: Callable[[str], None] | None = None) -> ProviderResponse:
+        return await asyncio.to_thread(self.generate, model, prompt, config, on_partial)
+
+    def generate_batch(self, model: str, prompts: list[str], config: dict) -> list[ProviderResponse | Exception]:
+        """
+        Answers many prompts at once, in order. A failed item is returned as
+        its exception; an exception raised here fails the whole batch.
+        Providers without a batch API answer one prompt at a time.
+        """
+        results = []
+        for prompt in prompts:
+            try:
+                results.append(self.generate(model, prompt, config))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def warm(self, model: str):
+        pass
+
+
+BATCH_DONE_STATES = {
+    types.JobState.JOB_STATE_SUCCEEDED,
+    types.JobState.JOB_STATE_FAILED,
+    types.JobState.JOB_STATE_CANCELLED,
+    types.JobState.JOB_STATE_EXPIRED,
+}
+
+
+def _gemini_response(text: str, usage) -> ProviderResponse:
+    total = getattr(usage, "total_token_count", None)
+    prompt = getattr(usage, "prompt_token_count", None)
+    output = total - prompt if total is not None and prompt is not None else None
+    return ProviderResponse(text, total_tokens=total, prompt_tokens=prompt, response_tokens=output)
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def generate(self, model, prompt, config, on_partial=None):
+        client = get_client()
+        config = types.GenerateContentConfig(**config)
+
+        if not on_partial:
+            response = client.models.generate_content(model=model, contents=prompt, config=config)
+            return _gemini_response(response.text, response.usage_metadata)
+
+        text, usage = "", None
+        for chunk in client.models.generate_content_stream(model=model, contents=prompt, config=config):
+            usage = chunk.usage_metadata or usage
+            if chunk.text:
+                text += chunk.text
+                on_partial(text)
+        return _gemini_response(text, usage)
+
+    async def generate_async(self, model, prompt, config, on_partial=None):
+        client = get_client()
+        config = types.GenerateContentConfig(**config)
+
+        if not on_partial:
+            response = await client.aio.models.generate_content(model=model, contents=prompt, config=config)
+            return _gemini_response(response.text, response.usage_metadata)
+
+        text, usage = "", None
+        async for chunk in await client.aio.models.generate_content_stream(model=model, contents=prompt, config=config):
+            usage = chunk.usage_metadata or usage
+            if chunk.text:
+                text += chunk.text
+                on_partial(text)
+        return _gemini_response(text, usage)
+
+    def generate_batch(self, model, prompts, config):
+        """
+        Submits the prompts as one Gemini batch job and polls until it ends.
+        """
+        client = get_client()
+        job = client.batches.create(
+            model=model,
+            src=[
+                types.InlinedRequest(contents=prompt, config=types.GenerateContentConfig(**config))
+                for prompt in prompts
+            ],
+            config=types.CreateBatchJobConfig(display_name=f"foundry-{len(prompts)}")
+        )
+
+        while job.state not in BATCH_DONE_STATES:
+            time.sleep(settings.LLM_BATCH_POLL_SECONDS)
+            job = client.batches.get(name=job.name)
+
+        if job.state != types.JobState.JOB_STATE_SUCCEEDED:
+            raise RuntimeError(f"Batch {job.name} ended in {job.state}: {job.error}")
+
+        results = []
+        for item in job.dest.inlined_responses:
+            if item.error or not item.response:
+                results.append(RuntimeError(f"Batch item failed: {item.error}"))
+            else:
+                results.append(_gemini_response(item.response.text, item.response.usage_metadata))
+        return results
+
+    def warm(self, model):
+        warm_client(model)
+
+
+class MockProvider(LLMProvider):
+    """
+    Answers offline with canned payloads, for load tests and benchmarks.
+
+    responses is a list of (phrase, payload); the first phrase found in the
+    prompt picks the payload, and the last entry is the fallback. Latency is
+    log-normal around `latency_median` seconds, and `error_rate` of the calls
+    fail with a retryable 503. A seed makes runs repeatable.
+    """
+    name = "mock"
+
+    def __init__(self, responses: list[tuple[str, dict]], latency_median: float = 2.0,
+                 latency_sigma: float = 0.5, error_rate: float = 0.0, seed: int | None = None):
+        self.responses = responses
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self) -> tuple[float, bool]:
+        with self._lock:
+            latency = self._random.lognormvariate(0, self.latency_sigma) * self.latency_median
+            failed = self._random.random() < self.error_rate
+        return latency, failed
+
+    def _payload(self, prompt: str) -> str:
+        for phrase, payload in self.responses:
+            if phrase in prompt:
+                break
+        return json.dumps(payload)
+
+    def _chunks(self, text: str, count: int = 5) -> list[str]:
+        size = max(len(text) // count, 1)
+        return [text[:end] for end in range(size, len(text), size)] + [text]
+
+    def _error(self) -> errors.APIError:
+        return errors.ServerError(503, {"error": {"code": 503, "message": "Mock provider failure", "status": "UNAVAILABLE"}})
+
+    def _response(self, prompt: str, text: str) -> ProviderResponse:
+        prompt_tokens, response_tokens = estimate_tokens(prompt), estimate_tokens(text)
+        return ProviderResponse(text, prompt_tokens + response_tokens, prompt_tokens, response_tokens)
+
+    def generate(self, model, prompt, config, on_partial=None):
+        latency, failed = self._draw()
+        text = self._payload(prompt)
+        if not on_partial:
+            time.sleep(latency)
+        else:
+            chunks = self._chunks(text)
+            for partial in chunks:
+                time.sleep(latency / len(chunks))
+                on_partial(partial)
+        if failed:
+            raise self._error()
+        return self._response(prompt, text)
+
+    async def generate_async(self, model, prompt, config, on_partial=None):
+        latency, failed = self._draw()
+        text = self._payload(prompt)
+        if not on_partial:
+            await asyncio.sleep(latency)
+        else:
+            chunks = self._chunks(text)
+            for partial in chunks:
+                await asyncio.sleep(latency / len(chunks))
+                on_partial(partial)
+        if failed:
+            raise self._error()
+        return self._response(prompt, text)
+
+    def generate_batch(self, model, prompts, config):
+        # One latency for the whole batch; failures are drawn per item
+        latency, _ = self._draw()
+        time.sleep(latency)
+
+        results = []
+        for prompt in prompts:
+            _, failed = self._draw()
+            results.append(self._error() if failed else self._response(prompt, self._payload(prompt)))
+        return results
+
+
+class CassetteMissing(Exception):
+    pass
+
+
+class CassetteProvider(LLMProvider):
+    """
+    Record/replay around another provider. In "record" mode every response
+    of the inner provider is written to a cassette file named after the
+    request; in "replay" mode requests are answered from those files only,
+    and a request without a cassette fails.
+    """
+    name = "cassette"
+
+    def __init__(self, inner: LLMProvider, directory: str, mode: str = "replay"):
+        self.inner = inner
+        self.directory = directory
+        self.mode = mode
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, model: str, prompt: str, config: dict) -> str:
+        return os.path.join(self.directory, f"{cache_key(model, prompt, config)}.json")
+
+    def _replay(self, path: str, prompt: str, on_partial) -> ProviderResponse:
+        if not os.path.exists(path):
+            raise CassetteMissing(f"No cassette for this request: {path}")
+        with open(path, encoding="utf-8") as f:
+            cassette = json.load(f)
+        if on_partial:
+            on_partial(cassette["text"])
+        return ProviderResponse(
+            cassette["text"],
+            cassette.get("total_tokens"),
+            cassette.get("prompt_tokens"),
+            cassette.get("response_tokens")
+        )
+
+    def _record(self, path: str, model: str, prompt: str, config: dict, response: ProviderResponse):
+        cassette = {
+            "model": model,
+            "config": config,
+            "prompt": prompt,
+            "text": response.text,
+            "total_tokens": response.total_tokens,
+            "prompt_tokens": response.prompt_tokens,
+            "response_tokens": response.response_tokens,
+        }
+        # Write then rename, so a crash never leaves half a cassette behind
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cassette, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def generate(self, model, prompt, config, on_partial=None):
+        path = self._path(model, prompt, config)
+        if self.mode == "replay":
+            return self._replay(path, prompt, on_partial)
+
+        response = self.inner.generate(model, prompt, config, on_partial)
+        self._record(path, model, prompt, config, response)
+        return response
+
+    async def generate_async(self, model, prompt, config, on_partial=None):
+        path = self._path(model, prompt, config)
+        if self.mode == "replay":
+            return self._replay(path, prompt, on_partial)
+
+        response = await self.inner.generate_async(model, prompt, config, on_partial)
+        self._record(path, model, prompt, config, response)
+        return response
+
+    def generate_batch(self, model, prompts, config):
+        paths = [self._path(model, prompt, config) for prompt in prompts]
+        if self.mode == "replay":
+            results = []
+            for path, prompt in zip(paths, prompts):
+                try:
+                    results.append(self._replay(path, prompt, None))
+                except CassetteMissing as e:
+                    results.append(e)
+            return results
+
+        results = self.inner.generate_batch(model, prompts, config)
+        for path, prompt, result in zip(paths, prompts, results):
+            if isinstance(result, ProviderResponse):
+                self._record(path, model, prompt, config, result)
+        return results
+
+    def warm(self, model):
+        if self.mode != "replay":
+            self.inner.warm(model)
+
+
+class BatchServerProvider(LLMProvider):
+    """
+    Sends batches to a batch server over HTTP, such as the local stand-in in
+    batch_server.py, and everything else to the inner provider.
+    """
+    name = "batch_server"
+
+    def __init__(self, inner: LLMProvider, url: str):
+        self.inner = inner
+        self.url = url.rstrip("/")
+
+    def generate(self, model, prompt, config, on_partial=None):
+        return self.inner.generate(model, prompt, config, on_partial)
+
+    async def generate_async(self, model, prompt, config, on_partial=None):
+        return await self.inner.generate_async(model, prompt, config, on_partial)
+
+    def generate_batch(self, model, prompts, config):
+        with httpx.Client(base_url=self.url, timeout=30) as http:
+            response = http.post("/v1/batches", json={"model": model, "config": config, "prompts": prompts})
+            response.raise_for_status()
+            batch = response.json()
+
+            while batch["state"] not in ("SUCCEEDED", "FAILED"):
+                time.sleep(settings.LLM_BATCH_POLL_SECONDS)
+                response = http.get(f"/v1/batches/{batch['name']}")
+                response.raise_for_status()
+                batch = response.json()
+
+        if batch["state"] != "SUCCEEDED":
+            raise RuntimeError(f"Batch {batch['name']} failed: {batch.get('error')}")
+
+        return [
+            ProviderResponse(item["text"], item.get("total_tokens"), item.get("prompt_tokens"), item.get("response_tokens"))
+            if "text" in item
+            else RuntimeError(f"Batch item failed: {item.get('error')}")
+            for item in batch["responses"]
+        ]
+
+    def warm(self, model):
+        self.inner.warm(model)
+
+
+def create_provider(mock_responses: list[tuple[str, dict]]) -> LLMProvider:
+    """
+    Builds the provider selected by LLM_PROVIDER: "gemini", "mock",
+    "record" (Gemini, saving cassettes) or "replay" (cassettes only).
+    With LLM_BATCH_URL set, batches go to that server instead.
+    """
+    provider = _create_provider(mock_responses)
+    if settings.LLM_BATCH_URL:
+        provider = BatchServerProvider(provider, settings.LLM_BATCH_URL)
+    return provider
+
+
+def _create_provider(mock_responses: list[tuple[str, dict]]) -> LLMProvider:
+    kind = settings.LLM_PROVIDER
+
+    if kind == "mock":
+        return MockProvider(
+            mock_responses,
+            latency_median=settings.LLM_MOCK_LATENCY_MEDIAN_SECONDS,
+            latency_sigma=settings.LLM_MOCK_LATENCY_SIGMA,
+            error_rate=settings.LLM_MOCK_ERROR_RATE,
+            seed=settings.LLM_MOCK_SEED
+        )
+    if kind in ("record", "replay"):
+        return CassetteProvider(GeminiProvider(), settings.LLM_CASSETTE_DIR, mode=kind)
+    if kind != "gemini":
+        print(f"Unknown LLM_PROVIDER {kind!r}, using gemini")
+    return GeminiProvider()
@@ -1,6 +1,7 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import time
 from dotenv import load_dotenv
 from workers import start_workers
 
@@ -10,12 +11,17 @@ from config import settings
 settings.validate()
 
 # Create database tables
-from database import engine, Base
+from database import engine, Base, add_missing_columns
 import models # Import models to register them with Base
+from metrics import http_request_duration
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine)
 
 
-start_workers()
+# API replicas can leave job processing to standalone workers (python -m workers)
+if settings.RUN_WORKERS_IN_API:
+    start_workers()
+
 app = FastAPI(title="Foundry Backend")
 
 app.add_middleware(
@@ -27,6 +33,32 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template rather than the raw path, to keep label values few
+        route = request.scope.get("route")
+        http_request_duration.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status
+        )
+
+
+if settings.PROFILING_ENABLED:
+    import profiling
+
+    profiling.instrument_engine(engine)
+    app.middleware("http")(profiling.profile_request)
+
+
 
 @app.get("/")
 async def root():
@@ -35,7 +67,7 @@ async def root():
 
 # Include routers
 # Include routers
-from routers import auth, users, workspaces, financials, analysis, dashboard
+from routers import auth, users, workspaces, financials, analysis, dashboard, system, jobs, updates, metrics
 
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -43,3 +75,7 @@ app.include_router(workspaces.router)
 app.include_router(financials.router)
 app.include_router(analysis.router)
 app.include_router(dashboard.router)
+app.include_router(system.router)
+app.include_router(jobs.router)
+app.include_router(updates.router)
+app.include_router(metrics.router)
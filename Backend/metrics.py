@@ -0,0 +1,227 @@
+"""
+Process-wide metrics in the Prometheus text format, served at /metrics.
+
+Counters and histograms are updated where things happen (HTTP middleware,
+job runner, model calls); gauges such as queue depth are read fresh by
+collectors on every scrape. Each process keeps its own values, so scrape
+standalone workers separately.
+"""
+import datetime
+import threading
+from typing import Callable
+
+from sqlalchemy import func
+
+from database import SessionLocal, engine
+from models import Job, claimable_job_filter
+
+# Seconds; HTTP handlers are fast, model calls and jobs are not
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SLOW_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            samples = list(self._samples())
+        for name, pairs, value in samples:
+            lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        for key, value in self._values.items():
+            yield self.name, list(zip(self.labelnames, key)), value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def _samples(self):
+        for key, value in self._values.items():
+            yield self.name, list(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = HTTP_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self):
+        for key, (counts, total) in self._values.items():
+            pairs = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket", pairs + [("le", _number(bound))], count
+            yield f"{self.name}_sum", pairs, total
+            yield f"{self.name}_count", pairs, counts[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """
+        collector refreshes gauges right before each scrape.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                # A failing collector must not take the other metrics down
+                print("Metrics collector failed:", str(e))
+
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "foundry_http_request_duration_seconds", "Time until the response starts, per route.",
+    ("method", "route", "status")
+))
+
+job_duration = registry.register(Histogram(
+    "foundry_job_duration_seconds", "Time to run a job, from claim to finish.",
+    ("type", "outcome"), SLOW_BUCKETS
+))
+
+job_queue_depth = registry.register(Gauge(
+    "foundry_job_queue_depth", "Jobs in the jobs table, waiting or running.",
+    ("type", "state")
+))
+
+job_oldest_age = registry.register(Gauge(
+    "foundry_job_oldest_age_seconds", "Age of the oldest waiting job, from its first request.",
+    ("type",)
+))
+
+llm_request_duration = registry.register(Histogram(
+    "foundry_llm_request_duration_seconds",
+    "Latency of each model call attempt, without rate limiter waits or backoff.",
+    ("model", "outcome"), SLOW_BUCKETS
+))
+
+llm_requests = registry.register(Counter(
+    "foundry_llm_requests_total", "Model calls by outcome (batch items count one each).",
+    ("model", "outcome")
+))
+
+llm_tokens = registry.register(Counter(
+    "foundry_llm_tokens_total", "Tokens sent to and received from the model.",
+    ("model", "kind")
+))
+
+db_pool = registry.register(Gauge(
+    "foundry_db_pool_connections", "Database connection pool usage.",
+    ("state",)
+))
+
+
+def collect_job_queue():
+    now = datetime.datetime.utcnow()
+    db = SessionLocal()
+    try:
+        totals = dict(db.query(Job.type, func.count(Job.id)).group_by(Job.type).all())
+        waiting = (
+            db.query(Job.type, func.count(Job.id), func.min(func.coalesce(Job.first_requested_time, Job.created_time)))
+            .filter(claimable_job_filter(now))
+            .group_by(Job.type)
+            .all()
+        )
+    finally:
+        db.close()
+
+    job_queue_depth.clear()
+    job_oldest_age.clear()
+    running = dict(totals)
+    for job_type, count, oldest in waiting:
+        running[job_type] -= count
+        job_queue_depth.set(count, type=job_type, state="waiting")
+        job_oldest_age.set((now - oldest).total_seconds(), type=job_type)
+    for job_type, count in running.items():
+        job_queue_depth.set(count, type=job_type, state="running")
+
+
+def collect_db_pool():
+    pool = engine.pool
+    # Not every pool class keeps these counts (e.g. NullPool). QueuePool
+    # reports overflow as negative until the pool is full.
+    for state, method in (("size", "size"), ("checked_out", "checkedout"), ("overflow", "overflow"), ("idle", "checkedin")):
+        if hasattr(pool, method):
+            db_pool.set(max(getattr(pool, method)(), 0), state=state)
+
+
+registry.add_collector(collect_job_queue)
+registry.add_collector(collect_db_pool)
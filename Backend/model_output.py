@@ -0,0 +1,120 @@
+import json
+import re
+
+from pydantic import BaseModel, ValidationError
+
+_FENCE = re.compile(r"^```[a-zA-Z]*\s*(.*?)\s*(?:```)?$", re.S)
+
+# Python spellings models sometimes use instead of the JSON ones
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _drop_trailing_comma(out: list[str]):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def repair_json(text: str) -> str:
+    """
+    Best-effort fix of near-valid JSON from a model, in one pass and without
+    another model call: strips code fences and text around the outermost
+    object, drops trailing commas, maps True/False/None to JSON, and closes
+    strings and brackets left open by a truncated response.
+    """
+    text = text.strip()
+    fenced = _FENCE.match(text)
+    if fenced:
+        text = fenced.group(1)
+
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text
+    text = text[min(starts):]
+
+    out = []
+    stack = []
+    in_string = False
+    escaped = False
+    i = 0
+
+    while i < len(text):
+        ch = text[i]
+
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            i += 1
+            if not stack or stack[-1] != ch:
+                continue  # Stray closer
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                break  # Anything after the outermost value is commentary
+            continue
+        elif ch.isalpha():
+            word = re.match(r"[A-Za-z]+", text[i:]).group(0)
+            out.append(_LITERALS.get(word, word))
+            i += len(word)
+            continue
+
+        out.append(ch)
+        i += 1
+
+    # Truncated response: close whatever is still open
+    if in_string:
+        if escaped:
+            out.pop()
+        out.append('"')
+    _drop_trailing_comma(out)
+    if out and out[-1] == ":":
+        out.append("null")
+    out.extend(reversed(stack))
+
+    return "".join(out)
+
+
+def parse_model_output(text: str, schema: type[BaseModel] | None = None) -> dict:
+    """
+    Parses a model response, repairing it locally when it is not valid JSON,
+    and validates it against schema. Returns a plain dict without null
+    fields, so the store's defaults apply to them.
+    Raises ValueError when the output cannot be used.
+    """
+    try:
+        data = json.loads(text)
+    except ValueError:
+        try:
+            data = json.loads(repair_json(text))
+        except ValueError as e:
+            raise ValueError(f"Model output is not valid JSON: {e}")
+        print("Repaired malformed JSON in model output")
+
+    if schema is None:
+        return data
+
+    try:
+        return schema.model_validate(data).model_dump(exclude_none=True)
+    except ValidationError as e:
+        problems = "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or '<root>'}: {error['msg']}"
+            for error in e.errors()[:5]
+        )
+        raise ValueError(f"Model output does not match {schema.__name__}: {problems}")
@@ -0,0 +1,116 @@
+import math
+import threading
+import time
+from collections import deque
+
+from config import settings
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+class LatencyTracker:
+    """
+    Recent model calls per model, as (finished at, seconds, succeeded).
+    Calls older than the routing window are forgotten, so a model that was
+    routed around gets tried again once its bad stretch has aged out.
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def _prune(self, calls: deque, now: float):
+        while calls and calls[0][0] < now - self.window_seconds:
+            calls.popleft()
+
+    def record(self, model: str, seconds: float, ok: bool):
+        now = time.monotonic()
+        with self._lock:
+            calls = self._calls.setdefault(model, deque())
+            calls.append((now, seconds, ok))
+            self._prune(calls, now)
+
+    def stats(self, model: str) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            calls = self._calls.get(model, deque())
+            self._prune(calls, now)
+            latencies = [seconds for _, seconds, _ in calls]
+            succeeded = sum(1 for _, _, ok in calls if ok)
+
+        if not latencies:
+            return {"calls": 0, "success_rate": None, "p50_ms": None, "p95_ms": None}
+        return {
+            "calls": len(latencies),
+            "success_rate": succeeded / len(latencies),
+            "p50_ms": _percentile(latencies, 0.5) * 1000,
+            "p95_ms": _percentile(latencies, 0.95) * 1000,
+        }
+
+    def all_stats(self) -> dict:
+        with self._lock:
+            models = list(self._calls)
+        return {model: self.stats(model) for model in models}
+
+    def within_budget(self, model: str, budget_seconds: float) -> bool:
+        """
+        Whether the model's recent p95 latency and success rate are good
+        enough. Too few recent calls count as good.
+        """
+        stats = self.stats(model)
+        if stats["calls"] < settings.LLM_ROUTING_MIN_SAMPLES:
+            return True
+        return (
+            stats["p95_ms"] <= budget_seconds * 1000
+            and stats["success_rate"] >= settings.LLM_ROUTING_MIN_SUCCESS_RATE
+        )
+
+
+latency_tracker = LatencyTracker(settings.LLM_ROUTING_WINDOW_SECONDS)
+
+
+def primary_model(job_type: str) -> str:
+    """
+    The model of the job type's configured tier.
+    """
+    return settings.LLM_MODELS[settings.LLM_MODEL_TIER[job_type]]
+
+
+def latency_budget(job_type: str, priority: str = "normal") -> float:
+    budget = settings.LLM_LATENCY_BUDGET_SECONDS[job_type]
+    if priority == "interactive":
+        budget = min(budget, settings.LLM_INTERACTIVE_LATENCY_BUDGET_SECONDS)
+    return budget
+
+
+def route(job_type: str, priority: str = "normal") -> str:
+    """
+    Picks the model for one job: its tier's model, or the fast model while
+    that one is over the latency budget.
+    """
+    model = primary_model(job_type)
+    fallback = settings.LLM_MODELS["fast"]
+
+    if priority == "background" or model == fallback:
+        return model
+    if latency_tracker.within_budget(model, latency_budget(job_type, priority)):
+        return model
+    return fallback
+
+
+def routing_stats() -> dict:
+    """
+    Recent latency and success rate per model, and where each job type is
+    currently routed at normal and interactive priority.
+    """
+    return {
+        "models": latency_tracker.all_stats(),
+        "routes": {
+            job_type: {priority: route(job_type, priority) for priority in ("normal", "interactive")}
+            for job_type in settings.LLM_MODEL_TIER
+        },
+    }
@@ -1,14 +1,17 @@
 from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, Text, JSON, Date
-from database import Base
+from database import Base, SessionLocal
 from sqlalchemy import ForeignKey
 from datetime import date
 import datetime
 from sqlalchemy.orm import relationship
 import uuid
-from sqlalchemy import  UniqueConstraint, Enum
+from sqlalchemy import  UniqueConstraint, Index, Enum, func, or_
 import datetime
 from sqlalchemy.orm import Session
 import enum
+from job_dispatch import dispatcher
+from event_bus import event_bus
+from config import settings
 
 def gen_id():
     return str(uuid.uuid4())
@@ -161,6 +164,8 @@ class AIIdeaAnalysis(Base):
     roadmap = Column(JSON, nullable=True)
 
     generated_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # sha256 of the model and prompt this result was generated from
+    input_fingerprint = Column(String, nullable=True)
 
 class FounderAlignmentModel(Base):
     __tablename__ = "founder_alignment"
@@ -182,6 +187,7 @@ class FounderAlignmentModel(Base):
     insight = Column(Text, nullable=True)
 
     generated_at = Column(DateTime, default=datetime.datetime.utcnow)
+    input_fingerprint = Column(String, nullable=True)
     model_version = Column(String, default="v1")
 
 class FinancialsModel(Base):
@@ -209,7 +215,8 @@ class FinancialsModel(Base):
 class InvestorReadiness(Base):
     __tablename__ = "investor_readiness"
 
-    id = Column(Integer, primary_key=True)
+    # The org id. Was declared Integer, which only SQLite let hold a string
+    id = Column(String, primary_key=True)
 
     readiness_score = Column(Float, nullable=False)
 
@@ -230,13 +237,15 @@ class InvestorReadiness(Base):
     next_action = Column(JSON, nullable=True)
 
     last_updated = Column(DateTime, default=datetime.datetime.utcnow)
+    input_fingerprint = Column(String, nullable=True)
 
 
 
 class DashboardModel(Base):
     __tablename__ = "dashboard"
 
-    id = Column(Integer, primary_key=True)
+    # The org id. Was declared Integer, which only SQLite let hold a string
+    id = Column(String, primary_key=True)
 
     # --- Executive Summary ---
     verdict = Column(String, nullable=True)  
@@ -278,12 +287,44 @@ class DashboardModel(Base):
     # e.g. ["founders", "financials", "market_inputs"]
 
     last_computed_at = Column(DateTime, default=datetime.datetime.utcnow)
+    input_fingerprint = Column(String, nullable=True)
+    # Input fingerprint of each model-written section, by section name
+    section_fingerprints = Column(JSON, nullable=True)
     model_version = Column(String, nullable=True)
 
 
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    # sha256 of (model, prompt, generation config)
+    key = Column(String, primary_key=True)
+    model = Column(String, nullable=False)
+    response = Column(Text, nullable=False)  # JSON string of the parsed response
+    size_bytes = Column(Integer, default=0)
+    hits = Column(Integer, default=0)
+
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    last_accessed_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    expires_at = Column(DateTime, nullable=False)
+
+
 def gen_id():
     return str(uuid.uuid4())
 
+
+# interactive: someone is waiting on the result (e.g. onboarding screen)
+# normal: follow-up work after an edit
+# background: backfills and other bulk work
+JOB_PRIORITIES = {"interactive": 0, "normal": 1, "background": 2}
+
+
+def priority_name(level: int | None) -> str:
+    for name, value in JOB_PRIORITIES.items():
+        if value == level:
+            return name
+    return "normal"
+
+
 class Job(Base):
     __tablename__ = "jobs"
 
@@ -297,26 +338,390 @@ class Job(Base):
     
     created_time = Column(DateTime, default=datetime.datetime.utcnow)
 
+    # Coalescing: first request of the current burst, and when the job may run
+    first_requested_time = Column(DateTime, nullable=True)
+    not_before = Column(DateTime, nullable=True, index=True)
+
+    # Lease: which worker owns the job, until when, and how many tries so far
+    claimed_by = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)
+
+    # Skip the LLM response cache, e.g. for an explicit user refresh
+    bypass_cache = Column(Boolean, default=False)
+
+    # See JOB_PRIORITIES; lower values are dispatched first
+    priority = Column(Integer, default=1)
+
+    # Set by upsert_job while a worker holds the lease: the job is run again
+    # once the current run ends, with the coalescing fields and flags above
+    # describing that next run (the running one read them when it started)
+    rerun_requested = Column(Boolean, default=False)
+
     __table_args__ = (
         UniqueConstraint('org_id', 'type', name='uix_org_type'),
     )
 
 
+class JobStatusModel(Base):
+    """
+    History of job runs, kept after the Job row itself is gone so clients and
+    other processes can look up how a job ended. Pruned by prune_job_status.
+    """
+    __tablename__ = "job_status"
+
+    job_id = Column(String, primary_key=True)
+    org_id = Column(String, nullable=False)
+    type = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # QUEUED, RUNNING, RETRYING, COMPLETED, FAILED, SUPERSEDED
+    priority = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    result = Column(JSON, nullable=True)
+    model = Column(String, nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)
+    response_tokens = Column(Integer, nullable=True)
+
+    queued_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+    __table_args__ = (
+        Index('ix_job_status_org_updated', 'org_id', 'updated_at'),
+    )
+
+
+FINISHED_JOB_STATUSES = ("COMPLETED", "FAILED", "SUPERSEDED")
+
+
 def gen_id():
     return str(uuid.uuid4())
 
-def upsert_job(db: Session, org_id: str, job_type: str) -> Job:
+def upsert_job(db: Session, org_id: str, job_type: str, bypass_cache: bool = False, priority: str = "normal",
+               bypass_debounce: bool = False) -> Job:
     """
-    Deletes any existing Job with the same (org_id, type) and creates a new one.
+    Deletes any existing Job with the same (org_id, type) and creates a new one,
+    then wakes the worker for that job type. A job a worker is running is
+    kept instead, marked to run again once it ends.
+
+    Repeated calls coalesce: the job only becomes eligible once the org has
+    stopped re-queueing it for the job type's debounce window, and no later
+    than JOB_MAX_DELAY_SECONDS after the first call of the burst. A burst
+    ends when a worker claims the job.
+    A cache bypass requested anywhere in the burst is kept, and so is the
+    most urgent priority.
+
+    bypass_debounce is for explicit user requests (e.g. re-run analysis):
+    the job is eligible at once instead of waiting out the window.
     """
-    # Delete existing job with same org_id and type
-    db.query(Job).filter(Job.org_id == org_id, Job.type == job_type).delete()
+    now = datetime.datetime.utcnow()
+
+    existing = db.query(Job).filter(Job.org_id == org_id, Job.type == job_type).first()
+    running = existing is not None and has_live_lease(existing, now)
+    # A job a worker is running has had its burst dispatched; this call
+    # starts a new one rather than inheriting its start time and flags,
+    # unless a re-run has already been requested during the run
+    pending = existing if existing and (not running or existing.rerun_requested) else None
+
+    first_requested = now
+    if pending and pending.first_requested_time:
+        first_requested = pending.first_requested_time
+    if pending and pending.bypass_cache:
+        bypass_cache = True
+    level = JOB_PRIORITIES[priority]
+    if pending and pending.priority is not None:
+        level = min(level, pending.priority)
+
+    debounce = datetime.timedelta(seconds=settings.JOB_DEBOUNCE_SECONDS.get(job_type, 0))
+    max_delay = datetime.timedelta(seconds=settings.JOB_MAX_DELAY_SECONDS)
+    not_before = min(now + debounce, first_requested + max_delay)
+    if bypass_debounce:
+        not_before = now
+
+    if running:
+        # Never replace a job under a live lease: another process would
+        # claim the replacement and run it at the same time. Its worker
+        # queues the re-run when this run ends (see complete_job).
+        updated = (
+            db.query(Job)
+            .filter(Job.id == existing.id, Job.claimed_by == existing.claimed_by)
+            .update({
+                Job.rerun_requested: True,
+                Job.first_requested_time: first_requested,
+                Job.not_before: not_before,
+                Job.bypass_cache: bypass_cache,
+                Job.priority: level,
+            }, synchronize_session=False)
+        )
+        db.commit()
+        if updated:
+            event_bus.publish(org_id, job_type, "queued", job_id=existing.id, not_before=not_before, rerun=True)
+            db.refresh(existing)
+            return existing
+        # The run ended meanwhile; queue a new job as usual
+
+    # Delete existing job with same org_id and type, unless a worker has
+    # claimed it since it was read
+    deleted = (
+        db.query(Job)
+        .filter(Job.org_id == org_id, Job.type == job_type, claimable_job_filter(now))
+        .delete()
+    )
+    if existing and not deleted:
+        # Claimed or finished meanwhile: look again
+        db.rollback()
+        return upsert_job(db, org_id, job_type, bypass_cache=bypass_cache, priority=priority,
+                          bypass_debounce=bypass_debounce)
+    if existing:
+        # A running job keeps its status; it reports how it ended itself
+        (
+            db.query(JobStatusModel)
+            .filter(JobStatusModel.job_id == existing.id, JobStatusModel.status.in_(("QUEUED", "RETRYING")))
+            .update({JobStatusModel.status: "SUPERSEDED", JobStatusModel.finished_at: now, JobStatusModel.updated_at: now}, synchronize_session=False)
+        )
     db.commit()  # commit deletion
 
     # Create new job
-    new_job = Job(id=gen_id(), org_id=org_id, type=job_type, created_time=datetime.datetime.utcnow())
+    new_job = Job(
+        id=gen_id(),
+        org_id=org_id,
+        type=job_type,
+        created_time=now,
+        first_requested_time=first_requested,
+        not_before=not_before,
+        bypass_cache=bypass_cache,
+        priority=level
+    )
     db.add(new_job)
+    db.add(JobStatusModel(
+        job_id=new_job.id, org_id=org_id, type=job_type, status="QUEUED",
+        priority=priority_name(level), queued_at=now, updated_at=now
+    ))
     db.commit()
     db.refresh(new_job)
 
-    return new_job
\ No newline at end of file
+    dispatcher.notify()
+    event_bus.publish(org_id, job_type, "queued", job_id=new_job.id, not_before=not_before)
+
+    return new_job
+
+
+def has_live_lease(job: Job, now: datetime.datetime) -> bool:
+    return job.claimed_by is not None and job.lease_expires_at is not None and job.lease_expires_at >= now
+
+
+def claimable_job_filter(now: datetime.datetime):
+    """
+    Jobs that nobody holds a live lease on.
+    """
+    return or_(Job.claimed_by.is_(None), Job.lease_expires_at < now)
+
+
+def claim_job(db: Session, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+    """
+    Atomically takes the lease on a job. Only one worker can win, across
+    threads and processes; expired leases can be taken over.
+    """
+    now = datetime.datetime.utcnow()
+    claimed = (
+        db.query(Job)
+        .filter(Job.id == job_id, claimable_job_filter(now))
+        .update(
+            {
+                Job.claimed_by: worker_id,
+                Job.lease_expires_at: now + datetime.timedelta(seconds=lease_seconds),
+                Job.attempts: func.coalesce(Job.attempts, 0) + 1,
+            },
+            synchronize_session=False
+        )
+    )
+    db.commit()
+    return claimed == 1
+
+
+def renew_leases(db: Session, job_ids: list[str], worker_id: str, lease_seconds: float):
+    if not job_ids:
+        return
+    (
+        db.query(Job)
+        .filter(Job.id.in_(job_ids), Job.claimed_by == worker_id)
+        .update(
+            {Job.lease_expires_at: datetime.datetime.utcnow() + datetime.timedelta(seconds=lease_seconds)},
+            synchronize_session=False
+        )
+    )
+    db.commit()
+
+
+def retry_delay_seconds(attempts: int) -> float:
+    """
+    Exponential backoff before retrying a job that has failed attempts times.
+    """
+    return min(settings.JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), settings.JOB_RETRY_MAX_SECONDS)
+
+
+def release_job(db: Session, job_id: str, worker_id: str, retry_at: datetime.datetime | None = None):
+    """
+    Gives up the lease after a failed attempt so the job can be retried,
+    no earlier than retry_at.
+    """
+    values = {Job.claimed_by: None, Job.lease_expires_at: None}
+    if retry_at is not None:
+        values[Job.not_before] = retry_at
+    (
+        db.query(Job)
+        .filter(Job.id == job_id, Job.claimed_by == worker_id)
+        .update(values, synchronize_session=False)
+    )
+    db.commit()
+
+
+def expire_exhausted_jobs(db: Session) -> int:
+    """
+    Drops jobs that used up their attempts without anyone recording the
+    outcome, i.e. the worker died during the last attempt and its lease has
+    lapsed. Their status rows are marked FAILED. Returns the number dropped.
+    """
+    now = datetime.datetime.utcnow()
+    jobs = (
+        db.query(Job)
+        .filter(claimable_job_filter(now), func.coalesce(Job.attempts, 0) >= settings.JOB_MAX_ATTEMPTS)
+        .all()
+    )
+    expired = [(job.id, job.org_id, job.type, job.claimed_by) for job in jobs]
+    for job in jobs:
+        error = f"Gave up after {job.attempts} attempts; the last one never finished"
+        (
+            db.query(JobStatusModel)
+            .filter(JobStatusModel.job_id == job.id, JobStatusModel.status.notin_(FINISHED_JOB_STATUSES))
+            .update({JobStatusModel.status: "FAILED", JobStatusModel.error: error,
+                     JobStatusModel.finished_at: now, JobStatusModel.updated_at: now}, synchronize_session=False)
+        )
+        print(f"{job.type} job {job.id} {error.lower()}")
+    db.commit()
+
+    for job_id, org_id, job_type, claimed_by in expired:
+        # Queues the re-run, if one was requested while the job was stuck
+        complete_job(db, job_id, claimed_by)
+        event_bus.publish(org_id, job_type, "failed", job_id=job_id, error="Gave up", retrying=False)
+    return len(expired)
+
+
+def complete_job(db: Session, job_id: str, worker_id: str) -> Job | None:
+    """
+    Removes a job its worker is done with, whether it succeeded, gave up or
+    had nothing to do. When a re-run was requested during the run, the row
+    is replaced by a fresh queued job for it, which is returned.
+    """
+    no_rerun = or_(Job.rerun_requested.is_(None), Job.rerun_requested.is_(False))
+    deleted = (
+        db.query(Job)
+        .filter(Job.id == job_id, Job.claimed_by == worker_id, no_rerun)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    if deleted:
+        return None
+
+    job = db.query(Job).filter(Job.id == job_id, Job.claimed_by == worker_id).first()
+    if job is None:
+        # Superseded, or the lease was taken over
+        return None
+
+    now = datetime.datetime.utcnow()
+    rerun = Job(
+        id=gen_id(),
+        org_id=job.org_id,
+        type=job.type,
+        created_time=now,
+        first_requested_time=job.first_requested_time,
+        not_before=job.not_before,
+        bypass_cache=job.bypass_cache,
+        priority=job.priority
+    )
+    db.delete(job)
+    db.flush()  # (org_id, type) is unique
+    db.add(rerun)
+    db.add(JobStatusModel(
+        job_id=rerun.id, org_id=rerun.org_id, type=rerun.type, status="QUEUED",
+        priority=priority_name(rerun.priority), queued_at=now, updated_at=now
+    ))
+    db.commit()
+    db.refresh(rerun)
+
+    dispatcher.notify()
+    event_bus.publish(rerun.org_id, rerun.type, "queued", job_id=rerun.id, not_before=rerun.not_before)
+    return rerun
+
+
+def pending_job_count(db: Session, org_id: str, job_type: str) -> int:
+    """
+    0 or 1: whether a job of this type is queued or running for the org.
+    A single lookup on the (org_id, type) unique index.
+    """
+    job = db.query(Job.id).filter(Job.org_id == org_id, Job.type == job_type).first()
+    return 1 if job else 0
+
+
+def count_pending_jobs(org_id: str, job_type: str) -> int:
+    """
+    pending_job_count on a session of its own, closed right away.
+    """
+    db = SessionLocal()
+    try:
+        return pending_job_count(db, org_id, job_type)
+    finally:
+        db.close()
+
+
+def record_job_status(db: Session, job_id: str, status: str, org_id: str | None = None, job_type: str | None = None, **fields):
+    """
+    Updates the status row of a job, creating it when org_id and job_type
+    are given (e.g. for jobs queued before the table existed).
+    """
+    now = datetime.datetime.utcnow()
+    row = db.query(JobStatusModel).filter_by(job_id=job_id).first()
+    if row is None:
+        if org_id is None or job_type is None:
+            return
+        row = JobStatusModel(job_id=job_id, org_id=org_id, type=job_type, queued_at=now)
+        db.add(row)
+
+    row.status = status
+    row.updated_at = now
+    for name, value in fields.items():
+        setattr(row, name, value)
+    db.commit()
+
+
+def prune_job_status(db: Session) -> int:
+    """
+    Drops finished status rows past JOB_STATUS_TTL_SECONDS, then the oldest
+    finished rows above JOB_STATUS_MAX_ROWS. Returns the number removed.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=settings.JOB_STATUS_TTL_SECONDS)
+    finished = JobStatusModel.status.in_(FINISHED_JOB_STATUSES)
+
+    removed = (
+        db.query(JobStatusModel)
+        .filter(finished, JobStatusModel.updated_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+
+    excess = db.query(JobStatusModel).count() - settings.JOB_STATUS_MAX_ROWS
+    if excess > 0:
+        oldest = (
+            db.query(JobStatusModel.job_id)
+            .filter(finished)
+            .order_by(JobStatusModel.updated_at.asc())
+            .limit(excess)
+        )
+        removed += (
+            db.query(JobStatusModel)
+            .filter(JobStatusModel.job_id.in_(oldest.scalar_subquery()))
+            .delete(synchronize_session=False)
+        )
+
+    db.commit()
+    return removed
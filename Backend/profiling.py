@@ -0,0 +1,198 @@
+"""
+Opt-in request profiling (PROFILING_ENABLED): wall time, event loop lag,
+SQL count and time per request, a slow-query log and, when asked for with
+the profile header, a sampled CPU profile. Results go to a Server-Timing
+response header and to a ring buffer read by GET /api/v1/admin/profiles.
+"""
+import asyncio
+import contextvars
+import datetime
+import itertools
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from dataclasses import dataclass, field
+
+from fastapi import Request
+from sqlalchemy import event
+
+from config import settings
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@dataclass
+class RequestProfile:
+    sql_count: int = 0
+    sql_seconds: float = 0.0
+    slow_queries: list = field(default_factory=list)
+
+
+_current = contextvars.ContextVar("request_profile", default=None)
+_ids = itertools.count(1)
+profiles = deque(maxlen=settings.PROFILING_BUFFER_SIZE)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+
+    profile = _current.get()
+    if profile is not None:
+        profile.sql_count += 1
+        profile.sql_seconds += elapsed
+
+    if elapsed >= settings.PROFILING_SLOW_QUERY_SECONDS:
+        sql = " ".join(statement.split())[:500]
+        print(f"Slow query ({elapsed * 1000:.1f} ms): {sql}")
+        if profile is not None:
+            profile.slow_queries.append({"ms": round(elapsed * 1000, 2), "sql": sql})
+
+
+def instrument_engine(engine):
+    """
+    Times every statement run through engine. Statements outside a
+    profiled request (e.g. in workers) only feed the slow-query log.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class LoopLagMonitor:
+    """
+    Sleeps in short steps on the event loop and adds up how late each wake
+    up is: time the loop spent blocked by synchronous code.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.blocked_seconds = 0.0
+        self._task = None
+
+    def ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.blocked_seconds += max(time.perf_counter() - started - self.interval, 0.0)
+
+
+loop_lag = LoopLagMonitor()
+
+
+class StackSampler:
+    """
+    Samples the stacks of all request-serving threads at a fixed interval
+    and counts the application frames seen. Concurrent requests share the
+    samples, so profile a quiet instance.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> list[dict]:
+        self._stop.set()
+        self._thread.join()
+        return [
+            {"stack": stack, "samples": count}
+            for stack, count in self.samples.most_common(settings.PROFILING_TOP_STACKS)
+        ]
+
+    def _run(self):
+        own = threading.get_ident()
+        # Job workers have their own threads; their time is not the request's
+        skipped = {t.ident for t in threading.enumerate() if t.name.startswith("foundry-")}
+
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own or ident in skipped:
+                    continue
+                stack = [
+                    f"{os.path.relpath(f.filename, APP_DIR)}:{f.name}:{f.lineno}"
+                    for f in traceback.extract_stack(frame)
+                    if f.filename.startswith(APP_DIR) and f.filename != __file__
+                ]
+                if stack:
+                    self.samples[";".join(stack)] += 1
+
+
+def authorized(request: Request) -> bool:
+    token = settings.PROFILING_ADMIN_TOKEN
+    return not token or request.headers.get("X-Admin-Token") == token
+
+
+async def profile_request(request: Request, call_next):
+    """
+    HTTP middleware; see the module docstring.
+    """
+    loop_lag.ensure_started()
+
+    sampler = None
+    if request.headers.get(settings.PROFILING_HEADER, "").lower() == "cpu" and authorized(request):
+        sampler = StackSampler(settings.PROFILING_SAMPLE_INTERVAL_SECONDS)
+        sampler.start()
+
+    profile = RequestProfile()
+    token = _current.set(profile)
+    blocked_before = loop_lag.blocked_seconds
+    started = time.perf_counter()
+    status = 500
+    response = None
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        wall = time.perf_counter() - started
+        _current.reset(token)
+
+        route = request.scope.get("route")
+        record = {
+            "id": next(_ids),
+            "at": datetime.datetime.utcnow().isoformat(),
+            "method": request.method,
+            "path": request.url.path,
+            "route": getattr(route, "path", None),
+            "status": status,
+            "wall_ms": round(wall * 1000, 2),
+            "loop_blocked_ms": round((loop_lag.blocked_seconds - blocked_before) * 1000, 2),
+            "sql_count": profile.sql_count,
+            "sql_ms": round(profile.sql_seconds * 1000, 2),
+            "slow_queries": profile.slow_queries,
+        }
+        if sampler is not None:
+            record["cpu_profile"] = sampler.stop()
+        profiles.append(record)
+
+    response.headers["Server-Timing"] = (
+        f'app;dur={record["wall_ms"]}, '
+        f'sql;dur={record["sql_ms"]};desc="{record["sql_count"]} queries", '
+        f'loop-blocked;dur={record["loop_blocked_ms"]}'
+    )
+    response.headers["X-Profile-Id"] = str(record["id"])
+    return response
+
+
+def recent_profiles(limit: int = 50, min_wall_ms: float = 0) -> list[dict]:
+    """
+    Newest first.
+    """
+    return [p for p in reversed(profiles) if p["wall_ms"] >= min_wall_ms][:limit]
+
+
+def get_profile(profile_id: int) -> dict | None:
+    return next((p for p in profiles if p["id"] == profile_id), None)
@@ -0,0 +1,234 @@
+import datetime
+import json
+import math
+import re
+
+# Rough average for English text and JSON; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+# Marks text that was cut to fit the prompt budget
+TRUNCATED = "…"
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def compact(value):
+    """
+    Copy of value without None, empty strings or empty containers, at any
+    depth. Strings holding JSON (some member fields are saved that way) are
+    parsed, so they are not re-escaped inside the prompt.
+    """
+    if isinstance(value, dict):
+        items = ((key, compact(item)) for key, item in value.items())
+        return {key: item for key, item in items if not _is_empty(item)}
+    if isinstance(value, (list, tuple)):
+        items = (compact(item) for item in value)
+        return [item for item in items if not _is_empty(item)]
+    if isinstance(value, str):
+        text = value.strip()
+        if text[:1] in ("{", "["):
+            try:
+                return compact(json.loads(text))
+            except ValueError:
+                pass
+        return text
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def to_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+# Strings are first shortened no further than this; below it, lists of
+# free text lose items before any string is cut shorter
+MIN_TEXT_CHARS = 80
+
+# Last item of a free-text list that lost items to the budget
+OMITTED = re.compile(r"^" + TRUNCATED + r" (\d+) more omitted$")
+
+
+def _children(container):
+    keys = container.keys() if isinstance(container, dict) else range(len(container))
+    for key in keys:
+        yield key, container[key]
+
+
+def _total_tokens(sections: dict) -> int:
+    return sum(estimate_tokens(to_json(value)) for value in sections.values())
+
+
+def _long_strings(container, min_chars: int) -> list:
+    """
+    Every string below container longer than min_chars, as (parent, key,
+    length). Notes of omitted list items are left out.
+    """
+    found = []
+    for key, value in _children(container):
+        if isinstance(value, (dict, list)):
+            found.extend(_long_strings(value, min_chars))
+        elif isinstance(value, str) and len(value) > min_chars and not OMITTED.match(value):
+            found.append((container, key, len(value)))
+    return found
+
+
+def _cap_strings(sections: dict, excess_chars: int, floor: int) -> bool:
+    """
+    Cuts every string longer than the highest cap (no lower than floor) at
+    which that saves excess_chars, so the longest strings shrink first and
+    end up the same length. Returns False when nothing could be cut.
+    """
+    found = _long_strings(sections, floor + len(TRUNCATED))
+    if not found:
+        return False
+
+    def saved(cap: int) -> int:
+        # A cut string keeps cap characters plus the TRUNCATED mark
+        return sum(length - cap - len(TRUNCATED) for _, _, length in found if length > cap + len(TRUNCATED))
+
+    low, high = floor, max(length for _, _, length in found)
+    while low < high:
+        cap = (low + high + 1) // 2
+        if saved(cap) >= excess_chars:
+            low = cap
+        else:
+            high = cap - 1
+
+    for parent, key, length in found:
+        if length > low + len(TRUNCATED):
+            parent[key] = parent[key][:low] + TRUNCATED
+    return True
+
+
+def _omitted_count(items: list) -> int:
+    match = items and isinstance(items[-1], str) and OMITTED.match(items[-1])
+    return int(match.group(1)) if match else 0
+
+
+class _TextList:
+    """
+    A list of plain strings that can lose items from its end. Lists of
+    objects (members, founders, ...) are never trimmed: dropping one would
+    silently change who the analysis is about.
+    """
+
+    def __init__(self, parent, key):
+        self.parent, self.key = parent, key
+        items = parent[key]
+        self.omitted = _omitted_count(items)
+        self.items = items[:-1] if self.omitted else items
+        self.sizes = [len(to_json(item)) for item in self.items]
+        self.size = len(to_json(items))
+
+    def trimmed(self, keep: int) -> list:
+        omitted = self.omitted + len(self.items) - keep
+        return self.items[:keep] + [f"{TRUNCATED} {omitted} more omitted"]
+
+    def saved(self, keep: int) -> int:
+        # Items and separating commas, less the note of omitted items
+        kept = 2 + sum(self.sizes[:keep]) + keep
+        return self.size - kept - len(to_json(self.trimmed(keep)[-1]))
+
+    def keep_for(self, fraction: float) -> int:
+        return max(1, math.ceil(len(self.items) * fraction))
+
+
+def _text_lists(container) -> list:
+    found = []
+    for key, value in _children(container):
+        if isinstance(value, (dict, list)):
+            found.extend(_text_lists(value))
+        if isinstance(value, list) and all(isinstance(item, str) for item in value):
+            if len(value) - (1 if _omitted_count(value) else 0) > 1:
+                found.append(_TextList(container, key))
+    return found
+
+
+def _trim_lists(sections: dict, excess_chars: int) -> bool:
+    """
+    Keeps the same, largest fraction of the items of every list of free
+    text that still saves excess_chars, each list keeping at least one.
+    Returns False when no list could get shorter.
+    """
+    lists = _text_lists(sections)
+
+    def saved(keeps: list) -> int:
+        return sum(max(text_list.saved(keep), 0) for text_list, keep in zip(lists, keeps))
+
+    def keeps_for(fraction: float) -> list:
+        return [text_list.keep_for(fraction) for text_list in lists]
+
+    low, high = 0.0, 1.0
+    if saved(keeps_for(low)) >= excess_chars:
+        for _ in range(20):
+            fraction = (low + high) / 2
+            if saved(keeps_for(fraction)) >= excess_chars:
+                low = fraction
+            else:
+                high = fraction
+
+    # Lists are cut in whole items; give back the next one to as many lists
+    # as the budget allows, so they do not all overshoot together
+    keeps, spare = keeps_for(low), saved(keeps_for(low)) - excess_chars
+    for i, text_list in enumerate(lists):
+        more = text_list.keep_for(high)
+        cost = max(text_list.saved(keeps[i]), 0) - max(text_list.saved(more), 0)
+        if more > keeps[i] and cost <= spare:
+            keeps[i], spare = more, spare - cost
+
+    trimmed = False
+    for text_list, keep in zip(lists, keeps):
+        if keep < len(text_list.items) and text_list.saved(keep) > 0:
+            text_list.parent[text_list.key] = text_list.trimmed(keep)
+            trimmed = True
+    return trimmed
+
+
+def fit_to_budget(sections: dict, max_tokens: int) -> int:
+    """
+    Shrinks sections, in place, until their JSON fits in max_tokens:
+    - the longest strings are cut to a common length, down to MIN_TEXT_CHARS;
+    - then lists of free text keep the same share of their items, with a
+      note of how many were left out;
+    - then strings are cut further.
+    Each step is sized from the remaining excess, so this takes a few passes
+    over the data. Lists of objects are never shortened. Returns the
+    estimated tokens of the result, which can still exceed the budget when
+    nothing is left to shrink.
+    """
+    while True:
+        tokens = _total_tokens(sections)
+        excess_chars = (tokens - max_tokens) * CHARS_PER_TOKEN
+        if excess_chars <= 0:
+            return tokens
+
+        # Every step makes the JSON strictly shorter, so this ends
+        if not (
+            _cap_strings(sections, excess_chars, MIN_TEXT_CHARS)
+            or _trim_lists(sections, excess_chars)
+            or _cap_strings(sections, excess_chars, 0)
+        ):
+            return tokens
+
+
+def render_prompt(template: str, max_tokens: int, **sections) -> str:
+    """
+    Fills template (str.format syntax) with each section as compact JSON,
+    leaving out empty fields and shrinking the largest ones until the whole
+    prompt fits in max_tokens.
+    """
+    data = {name: compact(value) for name, value in sections.items()}
+    overhead = estimate_tokens(template.format(**{name: "" for name in data}))
+
+    tokens = fit_to_budget(data, max_tokens - overhead)
+    if tokens + overhead > max_tokens:
+        print(f"Prompt still {tokens + overhead} tokens after trimming to a budget of {max_tokens}")
+
+    return template.format(**{name: to_json(value) for name, value in data.items()})
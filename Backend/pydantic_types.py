@@ -1,4 +1,4 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -82,7 +82,7 @@ class SetOnboardingRequest(BaseModel):
     step: int
 
 class MarketSchema(BaseModel):
-    tam_value: int
+    tam_value: float
     growth_rate_percent: int
     growth_index: int
     insight: str
@@ -152,3 +152,143 @@ class FinancialsSchema(BaseModel):
     class Config:
         orm_mode = True
 
+
+
+class RunwayDistributionSchema(BaseModel):
+    org_id: str
+    paths: int
+    horizon_months: int
+    deterministic_runway_months: float
+    # Percentiles (p10 ... p90), capped at horizon_months
+    runway_months: Dict[str, float]
+    # Chance of running out of cash within each number of months
+    out_of_cash_probability: Dict[str, float]
+
+# Structured model output. Each job type passes its schema to the model and
+# validates the response against it before storing.
+
+RiskLevel = Literal["Low", "Medium", "High"]
+
+
+class AlignmentRiskSchema(BaseModel):
+    risk: str
+    severity: RiskLevel
+    description: str
+    affected_roles: List[str] = []
+
+
+class AlignmentActionSchema(BaseModel):
+    action: str
+    priority: RiskLevel
+    owner: str
+    expected_outcome: str
+
+
+class FounderAlignmentPayload(BaseModel):
+    score: int
+    risk_level: RiskLevel
+    factors: Dict[str, str]
+    risks: List[AlignmentRiskSchema] = []
+    actions: List[AlignmentActionSchema] = []
+    primary_risk: Optional[str] = None
+    insight: Optional[str] = None
+
+
+class PushbackSchema(BaseModel):
+    title: str
+    points: List[str]
+
+
+class DemandSchema(BaseModel):
+    label: str
+    value: str
+    icon: Literal["equity", "control", "milestones", "governance"]
+
+
+class ReactionSchema(BaseModel):
+    label: Literal["Reject", "Soft Interest", "Fund"]
+    value: float
+
+
+class InvestorTypeSchema(BaseModel):
+    primary: str
+    sectorFit: str
+    stageFit: str
+    mismatchFlags: List[str] = []
+
+
+class RecommendationSchema(BaseModel):
+    verdict: Literal["Delay Fundraising", "Proceed", "Conditional"]
+    reason: str
+
+
+class NextActionSchema(BaseModel):
+    label: str
+    targetScreen: str
+
+
+class InvestorReadinessPayload(BaseModel):
+    readiness_score: float
+    pushbacks: List[PushbackSchema] = []
+    fixes: List[str] = []
+    demands: List[DemandSchema] = []
+    simulated_reaction: List[ReactionSchema] = []
+    investor_type: Optional[InvestorTypeSchema] = None
+    recommendation: Optional[RecommendationSchema] = None
+    summary_insight: str = ""
+    investor_mindset_quotes: List[str] = []
+    demand_warning: str = ""
+    next_action: Optional[NextActionSchema] = None
+
+
+class DashboardActionSchema(BaseModel):
+    title: str
+    why: str
+    risk: str
+    screenId: str
+
+
+# The dashboard's model-written sections; runway, burn and data sources are
+# computed locally
+
+class DashboardThesisSection(BaseModel):
+    verdict: str
+    thesis: str
+    capital_recommendation: Optional[str] = None
+
+
+class DashboardInsightSection(BaseModel):
+    killer_insight: str
+    killer_insight_risk: Optional[str] = None
+    killer_insight_confidence: Optional[float] = None
+
+
+class DashboardActionsSection(BaseModel):
+    top_actions: List[DashboardActionSchema] = []
+
+
+JobPriority = Literal["interactive", "normal", "background"]
+
+# Lower-case forms of the job_status values, for filtering by status
+JobStatusName = Literal["queued", "running", "retrying", "completed", "failed", "superseded"]
+
+
+class JobStatusSchema(BaseModel):
+    job_id: str
+    org_id: str
+    type: str
+    status: str
+    priority: Optional[str] = None
+    attempts: Optional[int] = None
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    model: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    response_tokens: Optional[int] = None
+    queued_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
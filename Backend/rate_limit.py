@@ -0,0 +1,220 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Callable
+
+from google.genai import errors
+
+from config import settings
+from prompt_builder import estimate_tokens as count_tokens
+
+
+# Provider errors worth retrying: rate limits and transient server failures
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """
+    Shared token bucket for requests per minute and tokens per minute.
+
+    Every model call in the process draws from the same buckets, so worker
+    threads and coroutines together stay under the quota instead of each
+    finding the ceiling with a 429. When the provider does push back, pause()
+    stops all callers until the retry-after window has passed.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._requests = requests_per_minute
+        self._tokens = tokens_per_minute
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def set_quota(self, requests_per_minute: float, tokens_per_minute: float):
+        with self._lock:
+            self.requests_per_minute = requests_per_minute
+            self.tokens_per_minute = tokens_per_minute
+            self._requests = min(self._requests, requests_per_minute)
+            self._tokens = min(self._tokens, tokens_per_minute)
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _try_acquire(self, tokens: int) -> float:
+        """
+        Takes one request and `tokens` tokens if available and returns 0,
+        otherwise returns how long to wait before trying again.
+        """
+        # A single call larger than the whole bucket would never fit
+        tokens = min(tokens, self.tokens_per_minute)
+
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+
+            self._refill(now)
+            if self._requests >= 1 and self._tokens >= tokens:
+                self._requests -= 1
+                self._tokens -= tokens
+                return 0.0
+
+            request_wait = (1 - self._requests) * 60 / self.requests_per_minute
+            token_wait = (tokens - self._tokens) * 60 / self.tokens_per_minute
+            return max(request_wait, token_wait, 0.01)
+
+    def acquire(self, tokens: int):
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int):
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int | None):
+        """
+        Corrects the token bucket once the real usage of a call is known.
+        """
+        if actual_tokens is None:
+            return
+        with self._lock:
+            self._tokens -= actual_tokens - estimated_tokens
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+limiter = RateLimiter(
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE
+)
+
+
+def estimate_tokens(prompt: str) -> int:
+    # The prompt, plus room for the JSON response
+    return count_tokens(prompt) + settings.LLM_EXPECTED_OUTPUT_TOKENS
+
+
+def is_retryable(e: Exception) -> bool:
+    if isinstance(e, errors.APIError):
+        return e.code in RETRYABLE_STATUS_CODES
+    # Connection resets, timeouts and similar transport failures
+    return isinstance(e, (ConnectionError, TimeoutError)) or type(e).__module__.startswith("httpx")
+
+
+def retry_after_seconds(e: Exception) -> float | None:
+    """
+    Reads the provider's hint: a Retry-After header, or the retryDelay of a
+    google.rpc.RetryInfo detail such as {"retryDelay": "17s"}.
+    """
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+
+    details = getattr(e, "details", None)
+    if isinstance(details, dict):
+        error = details.get("error", details)
+        for detail in error.get("details", []) or []:
+            delay = isinstance(detail, dict) and detail.get("retryDelay")
+            if delay:
+                match = re.match(r"([\d.]+)s", str(delay))
+                if match:
+                    return float(match.group(1))
+
+    return None
+
+
+def backoff_delay(attempt: int, e: Exception) -> float:
+    """
+    Delay before retry number `attempt` (starting at 1): the provider's hint
+    when it gives one, otherwise full-jitter exponential backoff.
+    """
+    hint = retry_after_seconds(e)
+    if hint is not None:
+        # A little jitter so paused callers do not all return at once
+        return hint + random.uniform(0, settings.LLM_BACKOFF_BASE_SECONDS)
+
+    ceiling = min(settings.LLM_BACKOFF_MAX_SECONDS, settings.LLM_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+def call_with_backoff(fn, tokens: int, on_attempt: Callable[[float, Exception | None], None] | None = None):
+    """
+    Runs fn() under the shared limiter, retrying retryable provider errors.
+
+    on_attempt, when given, is called after every attempt with the seconds
+    fn() itself took (limiter waits and backoff sleeps excluded) and the
+    error, or None on success.
+    """
+    attempt = 0
+    while True:
+        limiter.acquire(tokens)
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            if on_attempt:
+                on_attempt(time.perf_counter() - started, e)
+            attempt += 1
+            if not is_retryable(e) or attempt > settings.LLM_MAX_RETRIES:
+                raise
+
+            delay = backoff_delay(attempt, e)
+            if getattr(e, "code", None) == 429:
+                limiter.pause(delay)
+            print(f"Model call failed ({e}); retry {attempt} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        if on_attempt:
+            on_attempt(time.perf_counter() - started, None)
+        return result
+
+
+async def call_with_backoff_async(fn, tokens: int, on_attempt: Callable[[float, Exception | None], None] | None = None):
+    """
+    Async counterpart of call_with_backoff; fn returns an awaitable.
+    """
+    attempt = 0
+    while True:
+        await limiter.acquire_async(tokens)
+        started = time.perf_counter()
+        try:
+            result = await fn()
+        except Exception as e:
+            if on_attempt:
+                on_attempt(time.perf_counter() - started, e)
+            attempt += 1
+            if not is_retryable(e) or attempt > settings.LLM_MAX_RETRIES:
+                raise
+
+            delay = backoff_delay(attempt, e)
+            if getattr(e, "code", None) == 429:
+                limiter.pause(delay)
+            print(f"Model call failed ({e}); retry {attempt} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        if on_attempt:
+            on_attempt(time.perf_counter() - started, None)
+        return result
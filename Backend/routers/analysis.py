@@ -2,9 +2,11 @@ from fastapi import APIRouter, HTTPException, Depends, status, BackgroundTasks
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from database import get_db
-from models import AIIdeaAnalysis, Job, FounderAlignmentModel, InvestorReadiness, upsert_job
-from pydantic_types import AnalysisPayload, FounderAlignmentResponseModel
+from models import AIIdeaAnalysis, FounderAlignmentModel, InvestorReadiness, upsert_job, pending_job_count, count_pending_jobs
+from pydantic_types import AnalysisPayload, FounderAlignmentResponseModel, JobPriority
 from typing import Optional
+from event_bus import sse_response
+from functools import partial
 
 router = APIRouter(prefix="/api/v1", tags=["Analysis"])
 
@@ -63,7 +65,7 @@ def get_analysis(
 ):
     analysis = db.query(AIIdeaAnalysis).filter_by(workspace_id=org_id).order_by(AIIdeaAnalysis.generated_at.desc()).first()
 
-    size = db.query(Job).filter(Job.org_id == org_id, Job.type == "idea_analysis").count()
+    size = pending_job_count(db, org_id, "idea_analysis")
 
     return {
         "analysis": analysis,
@@ -71,14 +73,20 @@ def get_analysis(
     }
 
 @router.post("/{org_id}/idea-analysis", status_code=200)
-async def create_or_update_analysis(org_id: str, background_tasks: BackgroundTasks,db: Session = Depends(get_db)):
+async def create_or_update_analysis(org_id: str, background_tasks: BackgroundTasks,db: Session = Depends(get_db), refresh: bool = False, priority: JobPriority = "interactive"):
     
-    upsert_job(db, org_id, "idea_analysis")
+    upsert_job(db, org_id, "idea_analysis", bypass_cache=refresh, priority=priority, bypass_debounce=True)
     #print("post analysis")
 
     return {"status": "ok"}
 
 
+# GET /api/v1/{org_id}/idea-analysis/stream
+@router.get("/{org_id}/idea-analysis/stream")
+def stream_analysis(org_id: str):
+    return sse_response(org_id, "idea_analysis", partial(count_pending_jobs, org_id, "idea_analysis"))
+
+
 @router.get("/{org_id}/founder-alignment", response_model=FounderAlignmentResponseModel)
 async def get_alignment(org_id: str, db: Session = Depends(get_db)):
     alignment = (
@@ -88,7 +96,7 @@ async def get_alignment(org_id: str, db: Session = Depends(get_db)):
         .first()
     )
 
-    size = db.query(Job).filter(Job.org_id == org_id, Job.type == "founder_alignment").count()
+    size = pending_job_count(db, org_id, "founder_alignment")
 
     return {
         "alignment": alignment,
@@ -97,13 +105,18 @@ async def get_alignment(org_id: str, db: Session = Depends(get_db)):
 
 
 @router.post("/{org_id}/founder-alignment", status_code=200)
-async def create_or_update_alignment(org_id: str, background_tasks: BackgroundTasks,db: Session = Depends(get_db)):
+async def create_or_update_alignment(org_id: str, background_tasks: BackgroundTasks,db: Session = Depends(get_db), refresh: bool = False, priority: JobPriority = "interactive"):
     
-    upsert_job(db, org_id, "founder_alignment")
+    upsert_job(db, org_id, "founder_alignment", bypass_cache=refresh, priority=priority, bypass_debounce=True)
     #print("post alignment")
 
     return {"status": "ok"}
 
+# GET /api/v1/{org_id}/founder-alignment/stream
+@router.get("/{org_id}/founder-alignment/stream")
+def stream_alignment(org_id: str):
+    return sse_response(org_id, "founder_alignment", partial(count_pending_jobs, org_id, "founder_alignment"))
+
 
 # GET /api/v1/{org_id}/investor-readiness
 @router.get("/{org_id}/investor-readiness")
@@ -113,7 +126,7 @@ def get_investor_readiness(
 ):
     investor_readiness = db.query(InvestorReadiness).filter_by(id=org_id).order_by(InvestorReadiness.last_updated.desc()).first()
 
-    size = db.query(Job).filter(Job.org_id == org_id, Job.type == "investor_readiness").count()
+    size = pending_job_count(db, org_id, "investor_readiness")
 
     return {
         "investor_readiness": investor_readiness,
@@ -121,8 +134,13 @@ def get_investor_readiness(
     }
 
 @router.post("/{org_id}/investor-readiness", status_code=200)
-async def create_or_update_investor_readiness(org_id: str, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def create_or_update_investor_readiness(org_id: str, background_tasks: BackgroundTasks, db: Session = Depends(get_db), refresh: bool = False, priority: JobPriority = "interactive"):
     
-    upsert_job(db, org_id, "investor_readiness")
+    upsert_job(db, org_id, "investor_readiness", bypass_cache=refresh, priority=priority, bypass_debounce=True)
 
     return {"status": "ok"}
+
+# GET /api/v1/{org_id}/investor-readiness/stream
+@router.get("/{org_id}/investor-readiness/stream")
+def stream_investor_readiness(org_id: str):
+    return sse_response(org_id, "investor_readiness", partial(count_pending_jobs, org_id, "investor_readiness"))
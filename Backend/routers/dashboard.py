@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from database import get_db
-from models import DashboardModel, Job, upsert_job
+from models import DashboardModel, upsert_job, pending_job_count, count_pending_jobs
+from event_bus import sse_response
+from functools import partial
+from pydantic_types import JobPriority
 
 router = APIRouter(prefix="/api/v1", tags=["Dashboard"])
 
@@ -13,7 +16,7 @@ def get_dashboard(
 ):
     dashboard = db.query(DashboardModel).filter_by(id=org_id).order_by(DashboardModel.last_computed_at.desc()).first()
 
-    size = db.query(Job).filter(Job.org_id == org_id, Job.type == "dashboard").count()
+    size = pending_job_count(db, org_id, "dashboard")
     
     return {
         "dashboard": dashboard,
@@ -21,8 +24,13 @@ def get_dashboard(
     }
 
 @router.post("/{org_id}/dashboard", status_code=200)
-async def create_or_update_dashboard(org_id: str, db: Session = Depends(get_db)):
+async def create_or_update_dashboard(org_id: str, db: Session = Depends(get_db), refresh: bool = False, priority: JobPriority = "interactive"):
     print ("add job for dashboard")
-    upsert_job(db, org_id, "dashboard")
+    upsert_job(db, org_id, "dashboard", bypass_cache=refresh, priority=priority, bypass_debounce=True)
 
     return {"status": "ok"}
+
+# GET /api/v1/{org_id}/dashboard/stream
+@router.get("/{org_id}/dashboard/stream")
+def stream_dashboard(org_id: str):
+    return sse_response(org_id, "dashboard", partial(count_pending_jobs, org_id, "dashboard"))
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from database import get_db
 from models import FinancialsModel, upsert_job
-from pydantic_types import FinancialsSchema
+from pydantic_types import FinancialsSchema, RunwayDistributionSchema
+from runway_sim import simulate_runway
 import datetime
 
 router = APIRouter(prefix="/api/v1", tags=["Financials"])
@@ -70,3 +71,17 @@ def update_financials(org_id: str, data: FinancialsSchema, db: Session = Depends
         expense_pattern=fin.expense_pattern,
         last_updated=fin.last_updated
     )
+
+# GET /api/v1/{org_id}/financials/runway-distribution
+@router.get("/{org_id}/financials/runway-distribution", response_model=RunwayDistributionSchema)
+def get_runway_distribution(org_id: str, db: Session = Depends(get_db)):
+    fin = db.query(FinancialsModel).filter(FinancialsModel.org_id == org_id).first()
+    if not fin:
+        raise HTTPException(status_code=404, detail="Financials not found")
+
+    try:
+        distribution = simulate_runway(fin)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return RunwayDistributionSchema(org_id=org_id, **distribution)
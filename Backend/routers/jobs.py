@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from database import get_db
+from models import JobStatusModel
+from pydantic_types import JobStatusName, JobStatusSchema
+from typing import List, Optional
+
+router = APIRouter(prefix="/api/v1", tags=["Jobs"])
+
+# GET /api/v1/jobs/{job_id}
+@router.get("/jobs/{job_id}", response_model=JobStatusSchema)
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.query(JobStatusModel).filter_by(job_id=job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# GET /api/v1/{org_id}/jobs
+@router.get("/{org_id}/jobs", response_model=List[JobStatusSchema])
+def list_jobs(
+    org_id: str,
+    status: Optional[JobStatusName] = None,
+    type: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    query = db.query(JobStatusModel).filter(JobStatusModel.org_id == org_id)
+    if status:
+        query = query.filter(JobStatusModel.status == status.upper())
+    if type:
+        query = query.filter(JobStatusModel.type == type)
+
+    return query.order_by(JobStatusModel.updated_at.desc()).limit(limit).all()
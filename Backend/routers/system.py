@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Request
+from config import settings
+from llm_client import latency_stats
+from llm_cache import cache_stats
+from model_router import routing_stats
+from profiling import authorized, get_profile, recent_profiles
+
+router = APIRouter(prefix="/api/v1", tags=["System"])
+
+# GET /api/v1/llm/stats
+@router.get("/llm/stats")
+def get_llm_stats():
+    return {
+        **latency_stats(),
+        "cache": cache_stats(),
+        "routing": routing_stats()
+    }
+
+
+def check_profiling_access(request: Request):
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not authorized(request):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+# GET /api/v1/admin/profiles
+@router.get("/admin/profiles")
+def list_profiles(request: Request, limit: int = 50, min_wall_ms: float = 0):
+    check_profiling_access(request)
+    return recent_profiles(limit, min_wall_ms)
+
+# GET /api/v1/admin/profiles/{profile_id}
+@router.get("/admin/profiles/{profile_id}")
+def read_profile(profile_id: int, request: Request):
+    check_profiling_access(request)
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
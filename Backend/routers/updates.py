@@ -0,0 +1,21 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from event_bus import hub
+
+router = APIRouter(prefix="/api/v1", tags=["Updates"])
+
+# WS /api/v1/{org_id}/ws
+@router.websocket("/{org_id}/ws")
+async def org_updates(websocket: WebSocket, org_id: str):
+    """
+    Pushes job events for the org: queued, running, updated (a result row
+    was written), completed and failed. Replaces polling the GET endpoints.
+    """
+    await hub.connect(org_id, websocket)
+    try:
+        # Clients do not send anything; receiving is how a close is noticed
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.disconnect(org_id, websocket)
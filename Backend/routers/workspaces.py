@@ -206,7 +206,8 @@ async def update_workspace_service(org_id: str, data: dict, db: Session):
 async def update_workspace_and_insights(org_id: str, data: dict, db: Session = Depends(get_db)):
     await update_workspace_service(org_id, data, db)
 
-    upsert_job(db, org_id, "idea_analysis")
+    # Onboarding waits on this analysis
+    upsert_job(db, org_id, "idea_analysis", priority="interactive")
 
     return await get_workspace_by_id(org_id, db)
 
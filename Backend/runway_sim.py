@@ -0,0 +1,95 @@
+import numpy as np
+
+from config import settings
+
+# Mean monthly revenue growth by revenue_trend
+TREND_GROWTH = {"Growing": 0.05, "Flat": 0.0, "Declining": -0.05}
+
+# Relative error of the entered figures by data_confidence; "Rough" numbers
+# spread the paths much wider than "Precise" ones
+CONFIDENCE_SIGMA = {"Precise": 0.05, "Rough": 0.25}
+DEFAULT_SIGMA = 0.4
+
+# Share of the pipeline that converts each month: Beta(2, 8), mean 20%
+CONVERSION_ALPHA = 2
+CONVERSION_BETA = 8
+
+# Month-to-month noise of the variable part of the burn
+BURN_VOLATILITY = 0.15
+
+PERCENTILES = (10, 25, 50, 75, 90)
+OUT_OF_CASH_MONTHS = (6, 12, 18, 24)
+
+
+def simulate_runway(financials, paths: int | None = None, horizon_months: int | None = None,
+                    seed: int | None = None) -> dict:
+    """
+    Monte Carlo runway for one org's FinancialsModel: every path draws its
+    own starting figures (spread by data_confidence), revenue growth
+    (around revenue_trend), pipeline conversions and burn noise, and all
+    paths are stepped month by month as arrays.
+
+    monthly_burn is taken as total spend, offset by revenue. Runway is the
+    month cash first goes negative, interpolated within the month, and is
+    capped at the horizon for paths that never run out.
+
+    The generator is seeded, so the same figures always give the same
+    distribution. Raises ValueError without cash_in_bank and monthly_burn.
+    """
+    if not financials or financials.cash_in_bank is None or not financials.monthly_burn:
+        raise ValueError("cash_in_bank and monthly_burn are needed to simulate runway")
+
+    n = paths or settings.RUNWAY_SIMULATION_PATHS
+    months = horizon_months or settings.RUNWAY_SIMULATION_HORIZON_MONTHS
+    rng = np.random.default_rng(settings.RUNWAY_SIMULATION_SEED if seed is None else seed)
+    sigma = CONFIDENCE_SIGMA.get(financials.data_confidence, DEFAULT_SIGMA)
+
+    # Starting point; cash in the bank is usually known better than the rest
+    cash = financials.cash_in_bank * rng.lognormal(0, sigma / 2, n)
+    burn = financials.monthly_burn * rng.lognormal(0, sigma, n)
+    revenue = (financials.monthly_revenue or 0) * rng.lognormal(0, sigma, n)
+
+    # Existing revenue compounds at a per-path, per-month growth rate
+    growth = rng.normal(TREND_GROWTH.get(financials.revenue_trend, 0.0), sigma / 4, (n, months))
+    revenue = revenue[:, None] * np.cumprod(1 + growth, axis=1)
+
+    # New customers from the pipeline; subscriptions keep paying, other
+    # pricing models only in the month of the sale
+    if financials.customers_in_pipeline and financials.price_per_customer:
+        conversion = rng.beta(CONVERSION_ALPHA, CONVERSION_BETA, (n, 1))
+        won = rng.binomial(financials.customers_in_pipeline, conversion, (n, months))
+        if financials.pricing_model in (None, "Subscription"):
+            won = np.cumsum(won, axis=1)
+        revenue += won * financials.price_per_customer
+
+    # Only the variable share of the burn moves from month to month
+    fixed_share = min(max((financials.expense_pattern or 50) / 100, 0.0), 1.0)
+    noise = rng.normal(0, BURN_VOLATILITY * (1 - fixed_share), (n, months))
+    burn = burn[:, None] * np.clip(1 + noise, 0, None)
+
+    balance = cash[:, None] + np.cumsum(revenue - burn, axis=1)
+
+    broke = balance < 0
+    runs_out = broke.any(axis=1)
+    month = broke.argmax(axis=1)
+
+    # Interpolate within the month in which the balance crosses zero
+    rows = np.arange(n)
+    before = np.where(month > 0, balance[rows, np.maximum(month - 1, 0)], cash)
+    after = balance[rows, month]
+    fraction = before / np.maximum(before - after, 1e-9)
+    runway = np.where(runs_out, month + np.clip(fraction, 0, 1), months)
+
+    return {
+        "paths": n,
+        "horizon_months": months,
+        "deterministic_runway_months": round(financials.cash_in_bank / financials.monthly_burn, 1),
+        "runway_months": {
+            f"p{p}": round(float(value), 1)
+            for p, value in zip(PERCENTILES, np.percentile(runway, PERCENTILES))
+        },
+        "out_of_cash_probability": {
+            str(m): round(float(np.mean(runway < m)), 3)
+            for m in OUT_OF_CASH_MONTHS if m <= months
+        },
+    }
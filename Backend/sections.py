@@ -0,0 +1,102 @@
+import hashlib
+from dataclasses import dataclass, field
+from typing import Callable
+
+from pydantic import BaseModel, create_model
+
+from prompt_builder import render_prompt, to_json
+
+
+@dataclass
+class Section:
+    """
+    Part of a result that depends on its own subset of the inputs. A local
+    section is computed in process by compute; any other is written by the
+    model, following schema and the task text.
+    """
+    name: str
+    inputs: tuple[str, ...]
+    compute: Callable[[dict], dict] | None = None
+    schema: type[BaseModel] | None = None
+    task: str = ""
+
+    def fingerprint(self, inputs: dict) -> str:
+        data = to_json({name: inputs.get(name) for name in self.inputs})
+        return hashlib.sha256(f"{self.name}\n{data}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SectionPlan:
+    """
+    One recomputation: the local fields, and the prompt and schema for the
+    model sections being regenerated (no prompt when none are).
+    """
+    prompt: str | None
+    schema: type[BaseModel] | None
+    local: dict
+    # Input fingerprint of each regenerated model section, to store with it
+    fingerprints: dict = field(default_factory=dict)
+
+    def result(self, analysis: dict) -> dict:
+        """
+        Flattens the model's per-section output and adds the local fields.
+        """
+        fields = dict(self.local)
+        for section in analysis.values():
+            fields.update(section)
+        return fields
+
+
+_schemas = {}
+
+
+def sections_schema(sections: list[Section]) -> type[BaseModel]:
+    """
+    Response schema with one object per section, keyed by section name.
+    """
+    names = tuple(section.name for section in sections)
+    if names not in _schemas:
+        _schemas[names] = create_model(
+            "Sections_" + "_".join(names),
+            **{section.name: (section.schema, ...) for section in sections}
+        )
+    return _schemas[names]
+
+
+def plan_sections(sections: list[Section], inputs: dict, stored: dict | None, force: bool,
+                  template: str, max_tokens: int) -> SectionPlan:
+    """
+    Computes the local sections and picks the model sections to regenerate:
+    those whose inputs changed since their stored fingerprint, or all of
+    them with force. The prompt carries only the inputs those sections read.
+
+    template takes {inputs} (rendered as JSON) and {tasks}.
+    """
+    stored = stored or {}
+    local = {}
+    stale = []
+    fingerprints = {}
+
+    for section in sections:
+        if section.compute is not None:
+            local.update(section.compute(inputs))
+            continue
+        fingerprint = section.fingerprint(inputs)
+        if force or stored.get(section.name) != fingerprint:
+            stale.append(section)
+            fingerprints[section.name] = fingerprint
+
+    if not stale:
+        return SectionPlan(prompt=None, schema=None, local=local)
+
+    needed = dict.fromkeys(name for section in stale for name in section.inputs)
+    tasks = "\n\n".join(f'"{section.name}": {section.task}' for section in stale)
+    # The tasks are plain text, so escape them before the template is formatted
+    template = template.replace("{tasks}", tasks.replace("{", "{{").replace("}", "}}"))
+
+    return SectionPlan(
+        prompt=render_prompt(template, max_tokens, inputs={name: inputs.get(name) for name in needed}),
+        schema=sections_schema(stale),
+        local=local,
+        fingerprints=fingerprints
+    )
@@ -0,0 +1,27 @@
+from event_bus import EventBus
+
+
+def test_listeners_hear_every_org():
+    bus = EventBus()
+    heard = []
+    bus.add_listener(heard.append)
+
+    bus.publish("org-1", "dashboard", "queued", job_id="job-1")
+    bus.publish("org-2", "idea_analysis", "completed", job_id="job-2")
+
+    assert [(m["org_id"], m["event"]) for m in heard] == [("org-1", "queued"), ("org-2", "completed")]
+
+
+def test_a_failing_listener_does_not_stop_delivery():
+    bus = EventBus()
+    heard = []
+
+    def broken(message):
+        raise RuntimeError("boom")
+
+    bus.add_listener(broken)
+    bus.add_listener(heard.append)
+
+    bus.publish("org-1", "dashboard", "queued")
+
+    assert len(heard) == 1
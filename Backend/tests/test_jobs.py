@@ -0,0 +1,192 @@
+import datetime
+import threading
+
+from config import settings
+from models import Job, JobStatusModel, claim_job, complete_job, expire_exhausted_jobs, release_job, renew_leases, upsert_job
+
+LEASE_SECONDS = 60
+
+
+def _job(db, job_id: str) -> Job:
+    db.expire_all()
+    return db.query(Job).filter_by(id=job_id).first()
+
+
+def _status(db, job_id: str) -> str:
+    db.expire_all()
+    return db.query(JobStatusModel).filter_by(job_id=job_id).first().status
+
+
+def test_claim_job_takes_the_lease_once(db):
+    job_id = upsert_job(db, "org-1", "dashboard").id
+
+    assert claim_job(db, job_id, "worker-a", LEASE_SECONDS)
+    assert not claim_job(db, job_id, "worker-b", LEASE_SECONDS)
+
+    job = _job(db, job_id)
+    assert job.claimed_by == "worker-a"
+    assert job.attempts == 1
+
+
+def test_claim_job_takes_over_an_expired_lease(db):
+    job_id = upsert_job(db, "org-1", "dashboard").id
+    assert claim_job(db, job_id, "worker-a", LEASE_SECONDS)
+
+    db.query(Job).filter_by(id=job_id).update(
+        {Job.lease_expires_at: datetime.datetime.utcnow() - datetime.timedelta(seconds=1)}
+    )
+    db.commit()
+
+    assert claim_job(db, job_id, "worker-b", LEASE_SECONDS)
+    job = _job(db, job_id)
+    assert job.claimed_by == "worker-b"
+    assert job.attempts == 2
+
+
+def test_claim_job_has_one_winner_across_sessions(db, session_factory):
+    job_id = upsert_job(db, "org-1", "dashboard").id
+    start = threading.Barrier(8)
+    results = []
+
+    def claim(worker_id):
+        session = session_factory()
+        try:
+            start.wait()
+            results.append(claim_job(session, job_id, worker_id, LEASE_SECONDS))
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=claim, args=(f"worker-{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False] * 7 + [True]
+
+
+def test_renew_leases_only_extends_own_jobs(db):
+    own = upsert_job(db, "org-1", "dashboard").id
+    other = upsert_job(db, "org-2", "dashboard").id
+    claim_job(db, own, "worker-a", 1)
+    claim_job(db, other, "worker-b", 1)
+    other_expiry = _job(db, other).lease_expires_at
+
+    renew_leases(db, [own, other], "worker-a", LEASE_SECONDS)
+
+    assert _job(db, own).lease_expires_at > datetime.datetime.utcnow() + datetime.timedelta(seconds=LEASE_SECONDS / 2)
+    assert _job(db, other).lease_expires_at == other_expiry
+
+
+def test_upsert_job_coalesces_a_burst(db):
+    first = upsert_job(db, "org-1", "idea_analysis", bypass_cache=True, priority="background")
+    first_id, first_requested = first.id, first.first_requested_time
+    second = upsert_job(db, "org-1", "idea_analysis", priority="interactive")
+    third = upsert_job(db, "org-1", "idea_analysis", priority="normal")
+
+    assert db.query(Job).filter_by(org_id="org-1", type="idea_analysis").count() == 1
+    assert third.first_requested_time == first_requested
+    assert third.not_before >= second.not_before
+    # A cache bypass and the most urgent priority survive the burst
+    assert third.bypass_cache
+    assert third.priority == 0
+    assert _status(db, first_id) == "SUPERSEDED"
+
+
+def test_upsert_job_waits_no_longer_than_the_max_delay(db):
+    job = upsert_job(db, "org-1", "idea_analysis")
+    long_ago = datetime.datetime.utcnow() - datetime.timedelta(seconds=settings.JOB_MAX_DELAY_SECONDS + 10)
+    job.first_requested_time = long_ago
+    db.commit()
+
+    job = upsert_job(db, "org-1", "idea_analysis")
+
+    assert job.not_before == long_ago + datetime.timedelta(seconds=settings.JOB_MAX_DELAY_SECONDS)
+
+
+def test_upsert_job_starts_a_new_burst_once_the_job_is_claimed(db):
+    job = upsert_job(db, "org-1", "idea_analysis")
+    long_ago = datetime.datetime.utcnow() - datetime.timedelta(seconds=settings.JOB_MAX_DELAY_SECONDS + 10)
+    job.first_requested_time = long_ago
+    db.commit()
+    claim_job(db, job.id, "worker-a", LEASE_SECONDS)
+
+    job = upsert_job(db, "org-1", "idea_analysis")
+
+    debounce = datetime.timedelta(seconds=settings.JOB_DEBOUNCE_SECONDS["idea_analysis"])
+    assert job.first_requested_time > long_ago
+    assert job.not_before == job.first_requested_time + debounce
+
+
+def test_upsert_job_keeps_a_running_job_and_flags_a_rerun(db):
+    job_id = upsert_job(db, "org-1", "dashboard", bypass_debounce=True).id
+    claim_job(db, job_id, "worker-a", LEASE_SECONDS)
+
+    upsert_job(db, "org-1", "dashboard")
+
+    job = _job(db, job_id)
+    assert job.claimed_by == "worker-a"
+    assert job.rerun_requested
+    assert _status(db, job_id) == "QUEUED"
+    assert not claim_job(db, job_id, "worker-b", LEASE_SECONDS)
+    assert db.query(Job).count() == 1
+
+
+def test_complete_job_queues_the_requested_rerun(db):
+    job_id = upsert_job(db, "org-1", "dashboard", bypass_debounce=True).id
+    claim_job(db, job_id, "worker-a", LEASE_SECONDS)
+    upsert_job(db, "org-1", "dashboard", bypass_cache=True, priority="interactive")
+
+    rerun = complete_job(db, job_id, "worker-a")
+
+    assert _job(db, job_id) is None
+    assert rerun.claimed_by is None
+    assert rerun.bypass_cache
+    assert rerun.priority == 0
+    assert not rerun.rerun_requested
+    assert _status(db, rerun.id) == "QUEUED"
+
+
+def test_complete_job_deletes_a_job_without_rerun(db):
+    job_id = upsert_job(db, "org-1", "dashboard", bypass_debounce=True).id
+    claim_job(db, job_id, "worker-a", LEASE_SECONDS)
+
+    assert complete_job(db, job_id, "worker-b") is None
+    assert _job(db, job_id) is not None
+    assert complete_job(db, job_id, "worker-a") is None
+    assert db.query(Job).count() == 0
+
+
+def test_upsert_job_can_skip_the_debounce(db):
+    job = upsert_job(db, "org-1", "idea_analysis", bypass_debounce=True)
+
+    assert job.not_before == job.created_time
+
+
+def test_release_job_delays_the_retry(db):
+    job_id = upsert_job(db, "org-1", "dashboard", bypass_debounce=True).id
+    claim_job(db, job_id, "worker-a", LEASE_SECONDS)
+    retry_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=30)
+
+    release_job(db, job_id, "worker-a", retry_at=retry_at)
+
+    job = _job(db, job_id)
+    assert job.claimed_by is None
+    assert job.not_before == retry_at
+
+
+def test_expire_exhausted_jobs_drops_jobs_whose_last_attempt_died(db):
+    job_id = upsert_job(db, "org-1", "dashboard").id
+    db.query(Job).filter_by(id=job_id).update({
+        Job.attempts: settings.JOB_MAX_ATTEMPTS,
+        Job.claimed_by: "dead-worker",
+        Job.lease_expires_at: datetime.datetime.utcnow() - datetime.timedelta(seconds=1),
+    })
+    db.commit()
+    running = upsert_job(db, "org-2", "dashboard").id
+    claim_job(db, running, "worker-a", LEASE_SECONDS)
+
+    assert expire_exhausted_jobs(db) == 1
+    assert _job(db, job_id) is None
+    assert _status(db, job_id) == "FAILED"
+    assert _job(db, running) is not None
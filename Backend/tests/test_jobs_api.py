@@ -0,0 +1,30 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from database import get_db
+from models import upsert_job
+from routers import jobs
+
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(jobs.router)
+    app.dependency_overrides[get_db] = lambda: db
+    return TestClient(app)
+
+
+def test_list_jobs_filters_by_status(client, db):
+    upsert_job(db, "org-1", "dashboard")
+
+    queued = client.get("/api/v1/org-1/jobs", params={"status": "queued"})
+    failed = client.get("/api/v1/org-1/jobs", params={"status": "failed"})
+
+    assert [job["status"] for job in queued.json()] == ["QUEUED"]
+    assert failed.json() == []
+
+
+@pytest.mark.parametrize("params", [{"status": "bogus"}, {"limit": 0}, {"limit": 501}])
+def test_list_jobs_rejects_invalid_filters(client, params):
+    assert client.get("/api/v1/org-1/jobs", params=params).status_code == 422
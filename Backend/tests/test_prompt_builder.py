@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from prompt_builder import MIN_TEXT_CHARS, TRUNCATED, fit_to_budget, render_prompt, to_json, estimate_tokens
+
+
+def _tokens(sections: dict) -> int:
+    return sum(estimate_tokens(to_json(value)) for value in sections.values())
+
+
+def _org(members: int = 20, notes: int = 20, chars: int = 400) -> dict:
+    return {
+        "members": [
+            {"name": f"member-{i}", "notes": ["x" * chars] * notes, "bio": "y" * (5 * chars)}
+            for i in range(members)
+        ],
+        "risks": ["r" * chars] * notes,
+        "summary": "s" * (10 * chars),
+    }
+
+
+@pytest.mark.parametrize("budget", [20000, 6000, 2000, 800])
+def test_fit_to_budget_meets_the_budget(budget):
+    sections = _org()
+
+    tokens = fit_to_budget(sections, budget)
+
+    assert tokens == _tokens(sections)
+    assert budget * 0.95 <= tokens <= budget
+
+
+def test_fit_to_budget_is_fast_on_large_inputs():
+    sections = _org()
+
+    started = time.perf_counter()
+    fit_to_budget(sections, 6000)
+
+    assert time.perf_counter() - started < 0.2
+
+
+def test_fit_to_budget_leaves_data_within_budget_alone():
+    sections = _org(members=2, notes=2, chars=40)
+    before = to_json(sections)
+
+    assert fit_to_budget(sections, 10000) == _tokens(sections)
+    assert to_json(sections) == before
+
+
+def test_fit_to_budget_shortens_strings_before_dropping_list_items():
+    sections = {"summary": "s" * 4000, "risks": ["r" * 100] * 10}
+
+    fit_to_budget(sections, 500)
+
+    assert len(sections["risks"]) == 10
+    assert sections["summary"].endswith(TRUNCATED)
+    assert len(sections["summary"]) > MIN_TEXT_CHARS
+
+
+def test_fit_to_budget_notes_omitted_list_items():
+    sections = {"risks": [f"risk {i} " + "r" * 200 for i in range(50)]}
+
+    fit_to_budget(sections, 1000)
+
+    risks = sections["risks"]
+    assert risks[-1] == f"{TRUNCATED} {50 - (len(risks) - 1)} more omitted"
+    assert risks[0].startswith("risk 0 ")
+
+
+def test_fit_to_budget_never_drops_records():
+    sections = _org(members=20, notes=1)
+
+    fit_to_budget(sections, 50)
+
+    assert len(sections["members"]) == 20
+
+
+def test_render_prompt_fits_the_whole_prompt():
+    prompt = render_prompt("Org: {org}\nRisks: {risks}", 1000, org={"summary": "s" * 8000}, risks=["r" * 400] * 20)
+
+    assert estimate_tokens(prompt) <= 1000
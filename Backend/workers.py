@@ -1,66 +1,75 @@
 from models import InvestorReadiness
 import threading
-from queue import Queue
+import argparse
+import asyncio
+import multiprocessing
+import hashlib
+import socket
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable
 import time
-from sqlalchemy import asc
+from sqlalchemy import asc, exists, func, or_
+from sqlalchemy.orm import Session, aliased
 
 from models import User as UserModel,Job, AIIdeaAnalysis,FinancialsModel, FounderAlignmentModel, OrganizationModel as OrgModel, OrgMember as OrgMemberModel
-from pydantic_types import UserSchema, Workspace, UserOrgInfo, LoginRequest, CreateUserRequest, SetUserOrgInfoRequest, SetOnboardingRequest, MarketSchema, PersonaSchema, MilestoneSchema, RoadmapSchema, AnalysisPayload, FounderAlignmentResponse, FounderAlignmentResponseModel
+from pydantic import BaseModel
+from pydantic_types import AnalysisPayload
+from pydantic_types import FounderAlignmentPayload, InvestorReadinessPayload
+from pydantic_types import DashboardThesisSection, DashboardInsightSection, DashboardActionsSection
 import json
 import os
-from models import upsert_job
-from google import genai
-from google.genai import types
-from database import SessionLocal
+from models import JOB_PRIORITIES, priority_name, upsert_job, claim_job, claimable_job_filter, release_job, renew_leases, record_job_status, prune_job_status
+from models import expire_exhausted_jobs, retry_delay_seconds, complete_job
+from database import SessionLocal, Base, engine, add_missing_columns
 from models import DashboardModel
+from job_dispatch import dispatcher
+from event_bus import event_bus
+from llm_client import record_call
+from model_router import latency_tracker, primary_model, route
+import metrics
+from llm_providers import create_provider
+from llm_cache import cache_key, get_cached, store_cached
+from model_output import parse_model_output
+from prompt_builder import render_prompt, to_json, estimate_tokens as count_tokens
+from sections import Section, SectionPlan, plan_sections
+from runway_sim import simulate_runway
+from rate_limit import call_with_backoff, call_with_backoff_async, estimate_tokens, limiter
+from config import settings
 import datetime
 
 
-job_status = {}
+# Identifies this process in Job.claimed_by
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
 
 def build_prompt_from_org_and_founders(org, founders):
     """
     Build a structured prompt for AI idea analysis from organization data.
     """
-
-    # --- Basic Org Info ---
-    startup_type = getattr(org, "type", None) or "Not specified"
-    problem_statement = getattr(org, "problem", None) or "Not specified"
-    solution_statement = getattr(org, "solution", None) or "Not specified"
-    
-    # Optional fields
-    name = getattr(org, "name", None) or "Not specified"
-    industry = getattr(org, "industry", None) or "Not specified"
-    geography = getattr(org, "geography", None) or "Not specified"
-    stage = getattr(org, "stage", None) or "Not specified"
-    customer = getattr(org, "customer", None) or "Not specified"
-
-    founders = founders or []
-
-    founder_summary = ""
-    if founders:
-        founder_summary = "\n\nFounders:\n"
-        for user, org_member in founders:
-            founder_summary += f"- {user.full_name} | Role: {org_member.role} | Experience: {user.industry_experience}\n"
+    startup = build_startup_details(org)
+    founder_list = [
+        {
+            "name": user.full_name,
+            "role": org_member.role,
+            "experience": user.industry_experience
+        }
+        for user, org_member in founders or []
+    ]
 
     # --- Prompt Template ---
-    prompt = f"""
+    template = """
 You are an expert startup analyst.
 
 You will analyze the startup idea and generate a detailed idea validation report.
 
 
-Startup Details:
-- Startup Name: {name}
-- Industry: {industry}
-- Geography: {geography}
-- Stage: {stage}
-- Customer: {customer}
-- Startup Field: {startup_type}
-- Problem Statement: {problem_statement}
-- Solution by Startup: {solution_statement}
+Startup Details (JSON, unspecified fields are left out):
+{startup}
 
-{founder_summary}
+Founders:
+{founders}
 
 You must output the analysis in JSON format with the following structure:
 
@@ -103,71 +112,259 @@ Make sure to:
 - Provide 3 customer personas
 - Provide 3-5 milestones
 """
+    return render_prompt(
+        template,
+        settings.PROMPT_TOKEN_BUDGET["idea_analysis"],
+        startup=startup,
+        founders=founder_list
+    )
+
+
+# Generation settings for every analysis call; part of the cache key
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "temperature": 0.7,
+}
+
+
+def generation_config(schema: type[BaseModel] | None = None) -> dict:
+    """
+    GENERATION_CONFIG, plus the JSON schema the response must follow so
+    that the model cannot leave out required fields.
+    """
+    if schema is None:
+        return GENERATION_CONFIG
+    return {**GENERATION_CONFIG, "response_json_schema": schema.model_json_schema()}
 
-    return prompt
+
+def record_usage(usage: dict | None, prompt: str, response=None):
+    """
+    Fills usage with the prompt and response token counts of one call,
+    estimated where the provider does not report them. A cache hit spends
+    no response tokens.
+    """
+    if usage is None:
+        return
+    usage["prompt_tokens"] = (response and response.prompt_tokens) or count_tokens(prompt)
+    usage["response_tokens"] = 0
+    if response is not None:
+        usage["response_tokens"] = response.response_tokens or count_tokens(response.text or "")
 
 
-def query_model(prompt: str, model: str) -> dict:
+def _record_attempt(model: str, seconds: float, error: Exception | None):
+    """
+    Feeds one provider attempt, timed without limiter waits or backoff
+    sleeps, into the routing stats and the latency histogram. Rate limit
+    rejections (429) reflect our quota rather than the model, and the fast
+    model shares that quota, so they are left out of the routing stats.
+    """
+    rate_limited = getattr(error, "code", None) == 429
+    if error is None:
+        record_call(seconds)
+        outcome = "success"
+    else:
+        outcome = "rate_limited" if rate_limited else "error"
+    if not rate_limited:
+        latency_tracker.record(model, seconds, ok=error is None)
+    metrics.llm_request_duration.observe(seconds, model=model, outcome=outcome)
+
+
+def _record_model_call(model: str, ok: bool, usage: dict | None = None):
+    """
+    Counts one model call, retries included, and its tokens.
     """
-    Calls Gemini model with a prompt and returns parsed JSON response.
+    metrics.llm_requests.inc(model=model, outcome="success" if ok else "error")
+    for kind in ("prompt", "response"):
+        tokens = (usage or {}).get(f"{kind}_tokens")
+        if tokens:
+            metrics.llm_tokens.inc(tokens, model=model, kind=kind)
+
+
+def query_model(prompt: str, model: str, use_cache: bool = True, on_partial: Callable[[str], None] | None = None,
+                usage: dict | None = None, schema: type[BaseModel] | None = None) -> dict:
+    """
+    Sends a prompt to the configured LLM provider and returns the parsed JSON
+    response. Identical calls are answered from the LLM response cache.
+
+    With on_partial, the response is streamed and on_partial is called with
+    the text received so far after every chunk. A retried call starts the
+    text over. A usage dict, when given, receives the token counts.
+
+    With schema, the model is held to it and its output is validated
+    against it; near-valid JSON is repaired locally rather than re-requested.
     """
+    use_cache = use_cache and settings.LLM_CACHE_ENABLED
+    usage = {} if usage is None else usage
+    config = generation_config(schema)
+    key = cache_key(model, prompt, config)
+    if use_cache:
+        cached = get_cached(key)
+        if cached is not None:
+            record_usage(usage, prompt)
+            return cached
+
     print("QUERYING...")
     try:
-        client = genai.Client(api_key=os.environ.get("API_KEY"))
-        # Call the Gemini 3 Pro Preview model
-        response = client.models.generate_content(
-            model=model,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                temperature=0.7
-            )
+        tokens = estimate_tokens(prompt)
+        # Call the model, within the shared rate limit
+        response = call_with_backoff(
+            lambda: provider.generate(model, prompt, config, on_partial),
+            tokens,
+            on_attempt=partial(_record_attempt, model)
         )
+        limiter.record_usage(tokens, response.total_tokens)
+        record_usage(usage, prompt, response)
 
         if not response or not response.text:
             raise ValueError("Empty response from model")
         
     except Exception as e:
+        _record_model_call(model, False, usage)
+        raise RuntimeError(f"Error generating analysis: {str(e)}")
+
+    try:
+        analysis = parse_model_output(response.text, schema)
+    except ValueError:
+        _record_model_call(model, False, usage)
+        raise
+    _record_model_call(model, True, usage)
+
+    if settings.LLM_CACHE_ENABLED:
+        store_cached(key, model, analysis)
+    return analysis
+
+
+async def query_model_async(prompt: str, model: str, use_cache: bool = True, on_partial: Callable[[str], None] | None = None,
+                            usage: dict | None = None, schema: type[BaseModel] | None = None) -> dict:
+    """
+    Same as query_model, but awaits the provider's async API so an in-flight
+    request does not hold an OS thread.
+    """
+    use_cache = use_cache and settings.LLM_CACHE_ENABLED
+    usage = {} if usage is None else usage
+    config = generation_config(schema)
+    key = cache_key(model, prompt, config)
+    if use_cache:
+        cached = await asyncio.to_thread(get_cached, key)
+        if cached is not None:
+            record_usage(usage, prompt)
+            return cached
+
+    print("QUERYING...")
+    try:
+        tokens = estimate_tokens(prompt)
+        response = await call_with_backoff_async(
+            lambda: provider.generate_async(model, prompt, config, on_partial),
+            tokens,
+            on_attempt=partial(_record_attempt, model)
+        )
+        limiter.record_usage(tokens, response.total_tokens)
+        record_usage(usage, prompt, response)
+
+        if not response or not response.text:
+            raise ValueError("Empty response from model")
+
+    except Exception as e:
+        _record_model_call(model, False, usage)
         raise RuntimeError(f"Error generating analysis: {str(e)}")
-   
-    return json.loads(response.text)
+
+    try:
+        analysis = parse_model_output(response.text, schema)
+    except ValueError:
+        _record_model_call(model, False, usage)
+        raise
+    _record_model_call(model, True, usage)
+
+    if settings.LLM_CACHE_ENABLED:
+        await asyncio.to_thread(store_cached, key, model, analysis)
+    return analysis
+
+def query_model_batch(prompts: list[str], model: str, use_cache: list[bool],
+                      usages: list[dict] | None = None, schema: type[BaseModel] | None = None) -> list[dict | Exception]:
+    """
+    Batch counterpart of query_model: cached prompts are answered from the
+    cache, the rest go to the provider as one batch. Returns, in order, the
+    parsed response or the exception for each prompt.
+    """
+    config = generation_config(schema)
+    keys = [cache_key(model, prompt, config) for prompt in prompts]
+    results = [None] * len(prompts)
+    usages = usages or [{} for _ in prompts]
+
+    for i, key in enumerate(keys):
+        if use_cache[i] and settings.LLM_CACHE_ENABLED:
+            results[i] = get_cached(key)
+            if results[i] is not None:
+                record_usage(usages[i], prompts[i])
+    pending = [i for i, result in enumerate(results) if result is None]
+    if not pending:
+        return results
+
+    print(f"Sending batch of {len(pending)} prompts to {model}")
+    # Submitting the batch is one request; its items use the batch quota
+    responses = call_with_backoff(
+        lambda: provider.generate_batch(model, [prompts[i] for i in pending], config),
+        0
+    )
+    if len(responses) != len(pending):
+        raise RuntimeError(f"Batch returned {len(responses)} responses for {len(pending)} prompts")
+
+    for i, response in zip(pending, responses):
+        try:
+            if isinstance(response, Exception):
+                raise response
+            record_usage(usages[i], prompts[i], response)
+            if not response.text:
+                raise ValueError("Empty response from model")
+            results[i] = parse_model_output(response.text, schema)
+        except Exception as e:
+            _record_model_call(model, False, usages[i])
+            results[i] = RuntimeError(f"Error generating analysis: {str(e)}")
+            continue
+        _record_model_call(model, True, usages[i])
+
+        if settings.LLM_CACHE_ENABLED:
+            store_cached(keys[i], model, results[i])
+
+    return results
+
 
 def build_prompt_from_users(users):
     """
     users: list of tuples (UserModel, OrgMemberModel)
     returns: string prompt
     """
-    user_lines = []
-
-    for user, org_member in users:
-        user_lines.append(
-            f"- Name: {user.full_name or 'Unknown'}\n"
-            f"  Email: {user.email}\n"
-            f"  Member Type: {org_member.member_type}\n"
-            f"  Role: {org_member.role}\n"
-            f"  Permission Level: {org_member.permission_level}\n"
-            f"  Responsibility: {org_member.responsibility}\n"
-            f"  Authority: {org_member.authority}\n"
-            f"  Hours per Week: {org_member.hours_per_week}\n"
-            f"  Start Date: {org_member.start_date}\n"
-            f"  Planned Change: {org_member.planned_change}\n"
-            f"  Status: {org_member.status}\n"
-            f"  Cash Contribution: {org_member.cash_contribution}\n"
-            f"  Salary: {org_member.salary}\n"
-            f"  Bonus: {org_member.bonus}\n"
-            f"  Equity %: {org_member.equity}\n"
-            f"  Vesting: {org_member.vesting}\n"
-            f"  Vesting Cliff (years): {org_member.vesting_cliff}\n"
-            f"  Risk Tolerance: {org_member.risk_tolerance}\n"
-            f"  Expectations: {org_member.expectations}\n"
-        )
+    members = [
+        {
+            "name": user.full_name or "Unknown",
+            "email": user.email,
+            "member_type": org_member.member_type,
+            "role": org_member.role,
+            "permission_level": org_member.permission_level,
+            "responsibility": org_member.responsibility,
+            "authority": org_member.authority,
+            "hours_per_week": org_member.hours_per_week,
+            "start_date": org_member.start_date,
+            "planned_change": org_member.planned_change,
+            "status": org_member.status,
+            "cash_contribution": org_member.cash_contribution,
+            "salary": org_member.salary,
+            "bonus": org_member.bonus,
+            "equity_percent": org_member.equity,
+            "vesting": org_member.vesting,
+            "vesting_cliff_years": org_member.vesting_cliff,
+            "risk_tolerance": org_member.risk_tolerance,
+            "expectations": org_member.expectations,
+        }
+        for user, org_member in users
+    ]
 
-    prompt = f"""
+    template = """
 Analyze founder alignment for a startup based on the information provided below.
 
-Here are the current members of the org:
+Here are the current members of the org (JSON, empty fields are left out):
 
-{''.join(user_lines)}
+{members}
 
 Your task:
 1. Evaluate alignment across founders on:
@@ -225,732 +422,523 @@ Guidelines:
 
 """
 
-    return prompt
-
-
-def founder_alignment_worker():
-    while True:
-        db = SessionLocal()
-
-        job = None
+    return render_prompt(template, settings.PROMPT_TOKEN_BUDGET["founder_alignment"], members=members)
+
+
+SAMPLE_FOUNDER_ALIGNMENT = {
+    "score": 64,
+    "risk_level": "Medium",
+    "factors": {
+        "commitment_alignment": "Moderate alignment. CEO is fully committed. CTO is part-time and plans to reduce hours further, creating future execution risk.",
+        "role_clarity": "Roles are defined, but responsibilities overlap in hiring and team building. CTO has strong technical authority but low time commitment.",
+        "authority_balance": "Authority is uneven. CEO controls budget and strategy, CTO has technical authority only, COO has operations authority but limited decision power on budget.",
+        "time_commitment_balance": "Misaligned. CEO 60 hrs/week, CTO 25 hrs/week, COO 40 hrs/week. CTO’s time commitment is too low for the equity share.",
+        "equity_and_incentives": "Equity distribution favors CEO. CTO has high equity with high salary and low time commitment. COO has low equity but moderate salary and low risk tolerance.",
+        "risk_tolerance_alignment": "Mismatch. CEO is high risk, COO is low risk, CTO is medium risk. This can create tension in fundraising and growth pace.",
+        "governance_and_decision_making": "Moderate governance clarity. Budget control rests with CEO, but other founders may need formal voting or decision rules to avoid conflict."
+    },
+    "risks": [
+        {
+            "risk": "CTO under-commitment",
+            "severity": "High",
+            "description": "CTO contributes only 25 hours/week and plans to reduce further. Equity is 25% which is too high for part-time contribution.",
+            "affected_roles": ["CTO", "CEO"]
+        },
+        {
+            "risk": "Equity vs salary mismatch",
+            "severity": "Medium",
+            "description": "CTO has high salary and high equity, which reduces incentive to stay long-term if growth slows. COO has lower equity but takes significant operational burden.",
+            "affected_roles": ["CTO", "COO"]
+        },
+        {
+            "risk": "Decision-making bottleneck",
+            "severity": "Medium",
+            "description": "CEO controls budget and strategy, but operational and technical leaders are not formally included in governance decisions.",
+            "affected_roles": ["CEO", "CTO", "COO"]
+        }
+    ],
+    "actions": [
+        {
+            "action": "Reduce CTO equity or increase time commitment",
+            "priority": "High",
+            "owner": "CEO",
+            "expected_outcome": "Align CTO’s incentives with contribution and reduce future resentment."
+        },
+        {
+            "action": "Define a formal governance model",
+            "priority": "Medium",
+            "owner": "All founders",
+            "expected_outcome": "Clear decision rights, voting rules, and escalation process."
+        },
+        {
+            "action": "Rebalance COO incentives",
+            "priority": "Medium",
+            "owner": "CEO",
+            "expected_outcome": "Ensure COO feels fairly rewarded for operational execution (equity or bonus)."
+        }
+    ],
+    "primary_risk": "CTO under-commitment",
+    "insight": "The founder team has a strong vision but a core execution risk exists due to the CTO’s part-time commitment and high equity. This is likely to cause conflict during scaling, hiring, and product delivery."
+}
 
-        try:
-            # ✅ Pick the oldest pending job of type 'founder_alignment'
-            job = (
-                db.query(Job)
-                .filter(Job.type == "founder_alignment")
-                .order_by(asc(Job.created_time))
-                .first()
-            )
 
-            if not job:
-                time.sleep(1)  # No job, wait a bit
-                continue
+def prepare_founder_alignment(db, org_id: str) -> str:
+    """
+    Loads the org's members and builds the founder alignment prompt.
+    """
+    users = (
+        db.query(UserModel, OrgMemberModel)
+        .join(OrgMemberModel, OrgMemberModel.user_id == UserModel.id)
+        .filter(OrgMemberModel.org_id == org_id)
+        .all()
+    )
 
-            org_id = job.org_id
-            job_id = job.id
+    if not users:
+        raise ValueError("No users found for this organization")
 
-            # Update job status
-            job_status[job_id] = {"status": "RUNNING"}
+    prompt = build_prompt_from_users(users)
 
-            users = (
-                db.query(UserModel, OrgMemberModel)
-                .join(OrgMemberModel, OrgMemberModel.user_id == UserModel.id)
-                .filter(OrgMemberModel.org_id == org_id)
-                .all()
-            )
+    return prompt
 
-            if not users:
-                raise ValueError("No users found for this organization")
-
-            prompt = build_prompt_from_users(users)
-            
-            analysis = {
-                "score": 64,
-                "risk_level": "Medium",
-                "factors": {
-                    "commitment_alignment": "Moderate alignment. CEO is fully committed. CTO is part-time and plans to reduce hours further, creating future execution risk.",
-                    "role_clarity": "Roles are defined, but responsibilities overlap in hiring and team building. CTO has strong technical authority but low time commitment.",
-                    "authority_balance": "Authority is uneven. CEO controls budget and strategy, CTO has technical authority only, COO has operations authority but limited decision power on budget.",
-                    "time_commitment_balance": "Misaligned. CEO 60 hrs/week, CTO 25 hrs/week, COO 40 hrs/week. CTO’s time commitment is too low for the equity share.",
-                    "equity_and_incentives": "Equity distribution favors CEO. CTO has high equity with high salary and low time commitment. COO has low equity but moderate salary and low risk tolerance.",
-                    "risk_tolerance_alignment": "Mismatch. CEO is high risk, COO is low risk, CTO is medium risk. This can create tension in fundraising and growth pace.",
-                    "governance_and_decision_making": "Moderate governance clarity. Budget control rests with CEO, but other founders may need formal voting or decision rules to avoid conflict."
-                },
-                "risks": [
-                    {
-                        "risk": "CTO under-commitment",
-                        "severity": "High",
-                        "description": "CTO contributes only 25 hours/week and plans to reduce further. Equity is 25% which is too high for part-time contribution.",
-                        "affected_roles": ["CTO", "CEO"]
-                    },
-                    {
-                        "risk": "Equity vs salary mismatch",
-                        "severity": "Medium",
-                        "description": "CTO has high salary and high equity, which reduces incentive to stay long-term if growth slows. COO has lower equity but takes significant operational burden.",
-                        "affected_roles": ["CTO", "COO"]
-                    },
-                    {
-                        "risk": "Decision-making bottleneck",
-                        "severity": "Medium",
-                        "description": "CEO controls budget and strategy, but operational and technical leaders are not formally included in governance decisions.",
-                        "affected_roles": ["CEO", "CTO", "COO"]
-                    }
-                ],
-                "actions": [
-                    {
-                        "action": "Reduce CTO equity or increase time commitment",
-                        "priority": "High",
-                        "owner": "CEO",
-                        "expected_outcome": "Align CTO’s incentives with contribution and reduce future resentment."
-                    },
-                    {
-                        "action": "Define a formal governance model",
-                        "priority": "Medium",
-                        "owner": "All founders",
-                        "expected_outcome": "Clear decision rights, voting rules, and escalation process."
-                    },
-                    {
-                        "action": "Rebalance COO incentives",
-                        "priority": "Medium",
-                        "owner": "CEO",
-                        "expected_outcome": "Ensure COO feels fairly rewarded for operational execution (equity or bonus)."
-                    }
-                ],
-                "primary_risk": "CTO under-commitment",
-                "insight": "The founder team has a strong vision but a core execution risk exists due to the CTO’s part-time commitment and high equity. This is likely to cause conflict during scaling, hiring, and product delivery."
-            }
-            print("in founder alignment")
-            analysis = query_model(
-               prompt=prompt,
-               model="gemini-3-pro-preview"
-            )
 
-            
+def store_founder_alignment(db, org_id: str, analysis: dict) -> dict:
+    """
+    Stores a founder alignment analysis. _finish_job queues the jobs built on it
+    (JobSpec.upstream), such as the dashboard.
+    """
+    alignment = (
+        db.query(FounderAlignmentModel)
+        .filter_by(org_id=org_id)
+        .first()
+    )
+
+    # If not exists, create
+    if not alignment:
+        alignment = FounderAlignmentModel(org_id=org_id)
+        db.add(alignment)
+
+    # Assign fields from parsed JSON
+    alignment.score = analysis.get("score", 0)
+    alignment.risk_level = analysis.get("risk_level", "Low")
+    alignment.factors = analysis.get("factors", {})
+    alignment.risks = analysis.get("risks", [])
+    alignment.actions = analysis.get("actions", [])
+    alignment.primary_risk = analysis.get("primary_risk")
+    alignment.insight = analysis.get("insight")
+    alignment.model_version = "v1"
+    alignment.id = org_id
+    alignment.org_id = org_id
+
+    db.commit()
+    return {
+        "message": "Founder alignment created/updated",
+        "org_id": org_id
+    }
 
-            # dict-style access ONLY
-            
-            alignment = (
-                db.query(FounderAlignmentModel)
-                .filter_by(org_id=org_id)
-                .first()
-            )
 
-            # If not exists, create
-            if not alignment:
-                alignment = FounderAlignmentModel(org_id=org_id)
-                db.add(alignment)
-
-            # Assign fields from parsed JSON
-            alignment.score = analysis.get("score", 0)
-            alignment.risk_level = analysis.get("risk_level", "Low")
-            alignment.factors = analysis.get("factors", {})
-            alignment.risks = analysis.get("risks", [])
-            alignment.actions = analysis.get("actions", [])
-            alignment.primary_risk = analysis.get("primary_risk")
-            alignment.insight = analysis.get("insight")
-            alignment.model_version = "v1"
-            alignment.id = org_id
-            alignment.org_id = org_id
-            
-            db.commit()
-            # -------------------------
-            # 🟢 Call upsert_job for dashboard instead of queue
-            # -------------------------
-            upsert_job(db, org_id, "dashboard")
-
-            # Mark job as completed
-            job_status[job_id]["status"] = "COMPLETED"
-            job_status[job_id]["result"] = {
-                "message": "Founder alignment created/updated",
-                "org_id": org_id
+SAMPLE_IDEA_ANALYSIS = {
+    "seed_funding_probability": 62,
+    "market": {
+        "tam_value": 12.5,
+        "growth_rate_percent": 18,
+        "growth_index": 72,
+        "insight": "The global market for AI-driven customer support automation is large and growing rapidly. Adoption is strongest in mid-sized enterprises that need to reduce support costs while improving response times. Growth is driven by rising demand for 24/7 support and improved customer experience."
+    },
+    "investor": "This idea has strong potential due to a clear problem and a large addressable market. The product can scale well with recurring revenue, but differentiation will be critical. Investors will want proof of product-market fit and early traction in a specific niche before committing.",
+    "strengths": [
+        "Large and growing market with strong demand for automation.",
+        "Recurring revenue model (SaaS) with high scalability.",
+        "Clear pain point with measurable ROI for customers.",
+        "Strong potential for defensibility through data and AI models."
+    ],
+    "weaknesses": [
+        "Competitive space with many existing players and open-source tools.",
+        "Requires strong AI accuracy to avoid customer dissatisfaction.",
+        "High initial cost for training data and model fine-tuning.",
+        "Sales cycle may be long in enterprise segments."
+    ],
+    "personas": [
+        {
+            "name": "Support Manager",
+            "pain": "High support ticket volume, long response times, and lack of automation.",
+            "solution": "AI-assisted ticket triage and automated responses to common queries."
+        },
+        {
+            "name": "Head of Customer Experience",
+            "pain": "Low CSAT scores and inconsistent support quality across channels.",
+            "solution": "Unified AI agent providing consistent answers and tracking customer satisfaction."
+        },
+        {
+            "name": "Operations Director",
+            "pain": "Support costs are too high and hiring is slow.",
+            "solution": "Reduce support headcount by automating repetitive tasks and improving efficiency."
+        }
+    ],
+    "roadmap": {
+        "recommended_stage": "Early product-market fit (Prototype)",
+        "min_capital": 250000,
+        "max_capital": 750000,
+        "milestones": [
+            {
+                "label": "Build MVP with basic automation workflows",
+                "duration_days": 45,
+                "is_active": True
+            },
+            {
+                "label": "Run pilot with 3 mid-sized companies",
+                "duration_days": 60,
+                "is_active": True
+            },
+            {
+                "label": "Integrate with major support platforms (Zendesk, Freshdesk)",
+                "duration_days": 75,
+                "is_active": False
+            },
+            {
+                "label": "Launch public beta + pricing plan",
+                "duration_days": 30,
+                "is_active": False
             }
+        ]
+    },
+    "founder_summary": "Founders: CEO - 8 years in product management; CTO - 6 years in ML engineering; COO - 5 years in operations. Strong execution capability, but limited experience in enterprise sales.",
+    "notes": "This idea is strong if it targets a specific niche and builds defensibility through proprietary data and integrations."
+}
 
-            # -------------------------
-            # 🗑 Delete job from DB
-            # -------------------------
-            try:
-                db.delete(job)
-                db.commit()
-            except Exception:
-                db.rollback()  # Ignore deletion failure
-
-        except Exception as e:
-            db.rollback()
-            if job:
-                job_status[job_id]["status"] = "FAILED"
-                job_status[job_id]["error"] = str(e)
-            print("founder alignment Exception:", str(e))
-
-        finally:
-            db.close()
 
-def idea_analysis_worker():
-    while True:
-        
-        db = SessionLocal()
-
-        job = None
+def prepare_idea_analysis(db, org_id: str) -> str:
+    """
+    Loads the org and its founders and builds the idea analysis prompt.
+    """
+    # Fetch org info
+    org = db.query(OrgModel).filter_by(id=org_id).first()
+    if not org:
+        raise ValueError("No organization found for this ID")
 
-        try:
-            # ✅ Pick the oldest pending job of type 'idea_analysis'
-            job = (
-                db.query(Job)
-                .filter(Job.type == "idea_analysis")
-                .order_by(asc(Job.created_time))
-                .first()
-            )
+    users = (
+        db.query(UserModel, OrgMemberModel)
+        .join(OrgMemberModel, OrgMemberModel.user_id == UserModel.id)
+        .filter(OrgMemberModel.org_id == org_id)
+        .all()
+    )
 
-            if not job:
-                time.sleep(1)  # No job, wait a bit
-                continue
+    if not users:
+        raise ValueError("No users found for this organization")
 
-            org_id = job.org_id
-            job_id = job.id
+    prompt = build_prompt_from_org_and_founders(org, users)
 
-            # Update job status
-            job_status[job_id] = {"status": "RUNNING"}
+    return prompt
 
-            # Fetch org info
-            org = db.query(OrgModel).filter_by(id=org_id).first()
-            if not org:
-                raise ValueError("No organization found for this ID")
 
-            users = (
-                db.query(UserModel, OrgMemberModel)
-                .join(OrgMemberModel, OrgMemberModel.user_id == UserModel.id)
-                .filter(OrgMemberModel.org_id == org_id)
-                .all()
-            )
+def store_idea_analysis(db, org_id: str, analysis: dict) -> dict:
+    """
+    Stores an AI idea analysis. _finish_job queues the jobs built on it
+    (JobSpec.upstream), such as the dashboard.
+    """
+    idea = db.query(AIIdeaAnalysis).filter_by(workspace_id=org_id).first()
+    if not idea:
+        idea = AIIdeaAnalysis(workspace_id=org_id)
+        db.add(idea)
+
+
+    idea.seed_funding_probability = analysis.get("seed_funding_probability", 0)
+    idea.market = analysis.get("market", {})
+    idea.investor = analysis.get("investor", "")
+    idea.strengths = analysis.get("strengths", [])
+    idea.weaknesses = analysis.get("weaknesses", [])
+    idea.personas = analysis.get("personas", [])
+    idea.roadmap = analysis.get("roadmap", {})
+    idea.version = 1
+
+    db.commit()
+    return {
+        "message": "Idea analysis created/updated",
+        "org_id": org_id
+    }
 
-            if not users:
-                raise ValueError("No users found for this organization")
-            
-            prompt = build_prompt_from_org_and_founders(org, users)
-            
-
-            analysis = {
-                "seed_funding_probability": 62,
-                "market": {
-                    "tam_value": 12.5,
-                    "growth_rate_percent": 18,
-                    "growth_index": 72,
-                    "insight": "The global market for AI-driven customer support automation is large and growing rapidly. Adoption is strongest in mid-sized enterprises that need to reduce support costs while improving response times. Growth is driven by rising demand for 24/7 support and improved customer experience."
-                },
-                "investor": "This idea has strong potential due to a clear problem and a large addressable market. The product can scale well with recurring revenue, but differentiation will be critical. Investors will want proof of product-market fit and early traction in a specific niche before committing.",
-                "strengths": [
-                    "Large and growing market with strong demand for automation.",
-                    "Recurring revenue model (SaaS) with high scalability.",
-                    "Clear pain point with measurable ROI for customers.",
-                    "Strong potential for defensibility through data and AI models."
-                ],
-                "weaknesses": [
-                    "Competitive space with many existing players and open-source tools.",
-                    "Requires strong AI accuracy to avoid customer dissatisfaction.",
-                    "High initial cost for training data and model fine-tuning.",
-                    "Sales cycle may be long in enterprise segments."
-                ],
-                "personas": [
-                    {
-                        "name": "Support Manager",
-                        "pain": "High support ticket volume, long response times, and lack of automation.",
-                        "solution": "AI-assisted ticket triage and automated responses to common queries."
-                    },
-                    {
-                        "name": "Head of Customer Experience",
-                        "pain": "Low CSAT scores and inconsistent support quality across channels.",
-                        "solution": "Unified AI agent providing consistent answers and tracking customer satisfaction."
-                    },
-                    {
-                        "name": "Operations Director",
-                        "pain": "Support costs are too high and hiring is slow.",
-                        "solution": "Reduce support headcount by automating repetitive tasks and improving efficiency."
-                    }
-                ],
-                "roadmap": {
-                    "recommended_stage": "Early product-market fit (Prototype)",
-                    "min_capital": 250000,
-                    "max_capital": 750000,
-                    "milestones": [
-                        {
-                            "label": "Build MVP with basic automation workflows",
-                            "duration_days": 45,
-                            "is_active": True
-                        },
-                        {
-                            "label": "Run pilot with 3 mid-sized companies",
-                            "duration_days": 60,
-                            "is_active": True
-                        },
-                        {
-                            "label": "Integrate with major support platforms (Zendesk, Freshdesk)",
-                            "duration_days": 75,
-                            "is_active": False
-                        },
-                        {
-                            "label": "Launch public beta + pricing plan",
-                            "duration_days": 30,
-                            "is_active": False
-                        }
-                    ]
-                },
-                "founder_summary": "Founders: CEO - 8 years in product management; CTO - 6 years in ML engineering; COO - 5 years in operations. Strong execution capability, but limited experience in enterprise sales.",
-                "notes": "This idea is strong if it targets a specific niche and builds defensibility through proprietary data and integrations."
-            }
-            # -------------------------
-            # 🧠 Call the model here
-            # -------------------------
-            print("in idea analysis")
-            analysis = query_model(
-               prompt=prompt,
-               model="gemini-3-pro-preview"
-            )
 
-            # If your model returns a dict, use it directly
-            # Otherwise parse JSON here
-
-            # -------------------------
-            # 🔥 Save to DB
-            # -------------------------
-            
-            idea = db.query(AIIdeaAnalysis).filter_by(workspace_id=org_id).first()
-            if not idea:
-                idea = AIIdeaAnalysis(workspace_id=org_id)
-                db.add(idea)
-            
-
-            idea.seed_funding_probability = analysis.get("seed_funding_probability", 0)
-            idea.market = analysis.get("market", {})
-            idea.investor = analysis.get("investor", "")
-            idea.strengths = analysis.get("strengths", [])
-            idea.weaknesses = analysis.get("weaknesses", [])
-            idea.personas = analysis.get("personas", [])
-            idea.roadmap = analysis.get("roadmap", {})
-            idea.version = 1
+SAMPLE_INVESTOR_READINESS = {
+    "readiness_score": 0.48,
+    "pushbacks": [
+        {
+            "title": "Why this team?",
+            "points": [
+                "CEO commitment is only 10 hrs/week",
+                "CTO owns 65% equity"
+            ]
+        },
+        {
+            "title": "Who owns execution?",
+            "points": [
+                "No clear ownership of product delivery"
+            ]
+        }
+    ],
+    "fixes": [
+        "Increase CEO time commitment",
+        "Clarify ownership responsibilities",
+        "Strengthen product roadmap"
+    ],
+    "demands": [
+        {
+            "label": "Equity Split",
+            "value": "20%",
+            "icon": "equity"
+        },
+        {
+            "label": "Board Control",
+            "value": "Quarterly Board Updates",
+            "icon": "control"
+        },
+        {
+            "label": "Milestone Metrics",
+            "value": "Achieve MVP in 6 months",
+            "icon": "milestones"
+        }
+    ],
+    "simulated_reaction": [
+        {"label": "Reject", "value": 70},
+        {"label": "Soft Interest", "value": 20},
+        {"label": "Fund", "value": 10}
+    ],
+    "investor_type": {
+        "primary": "VC",
+        "sectorFit": "Tech",
+        "stageFit": "Seed",
+        "mismatchFlags": ["Equity Disagreement", "Team Commitment"]
+    },
+    "recommendation": {
+        "verdict": "Conditional",
+        "reason": "Team alignment needs improvement before full funding"
+    },
+    "summary_insight": "The startup shows promise but needs better team alignment and clarity on execution ownership.",
+    "investor_mindset_quotes": [
+        "I invest in people, not just ideas.",
+        "Market traction is more important than a perfect plan.",
+        "Equity and control always come first."
+    ],
+    "demand_warning": "High investor demands may delay fundraising.",
+    "next_action": {"label": "Improve Team Alignment", "targetScreen": "TeamAlignmentScreen"}
+}
+
+
+def prepare_investor_readiness(db, org_id: str) -> str:
+    """
+    Loads the org and its financials and builds the investor readiness prompt.
+    """
+    print(f"Processing investor readiness analysis for org {org_id}")
+    org = db.query(OrgModel).filter_by(id=org_id).first()
+    if not org:
+        raise ValueError("No organization found for this ID")
 
-            db.commit()
-            # -------------------------
-            # 🟢 Call upsert_job for dashboard instead of queue
-            # -------------------------
-            upsert_job(db, org_id, "dashboard")
-
-            # Mark job as completed
-            job_status[job_id]["status"] = "COMPLETED"
-            job_status[job_id]["result"] = {
-                "message": "Idea analysis created/updated",
-                "org_id": org_id
-            }
+    financials = (
+        db.query(FinancialsModel)
+        .filter(FinancialsModel.org_id == org_id)
+        .first()
+    )
 
-            # -------------------------
-            # 🗑 Delete job from DB
-            # -------------------------
-            try:
-                db.delete(job)
-                db.commit()
-            except Exception:
-                db.rollback()  # Ignore deletion failure
+    if not financials:
+        raise ValueError("No financials found for this organization")
 
-        except Exception as e:
-            db.rollback()
-            if job:
-                job_status[job_id]["status"] = "FAILED"
-                job_status[job_id]["error"] = str(e)
-            print("idea analysis Exception:", str(e))
+    prompt = build_prompt_from_org_and_financials(org, financials)
 
-        finally:
-            db.close()
+    return prompt
 
 
-def investor_readiness_worker():
+def store_investor_readiness(db, org_id: str, analysis: dict) -> dict:
     """
-    Worker function to process investor readiness analysis tasks.
+    Stores an investor readiness analysis. _finish_job queues the jobs built on it
+    (JobSpec.upstream), such as the dashboard.
     """
-    while True:
-        db = SessionLocal()
-        job = None
-
-        try:
-            # ✅ Pick the oldest pending job of type 'investor_readiness'
-            job = (
-                db.query(Job)
-                .filter(Job.type == "investor_readiness")
-                .order_by(asc(Job.created_time))
-                .first()
-            )
-
-            if not job:
-                time.sleep(1)  # No job, wait a bit
-                continue
-
-            org_id = job.org_id
-            job_id = job.id
-            job_status[job_id] = {"status": "RUNNING"}
-
-            # Update job status
-            # Process the job
-            print(f"Processing investor readiness analysis for job {job_id}")
-            org = db.query(OrgModel).filter_by(id=org_id).first()
-            if not org:
-                raise ValueError("No organization found for this ID")
-
-            financials = (
-                db.query(FinancialsModel)
-                .filter(FinancialsModel.org_id == org_id)
-                .first()
-            )
-
-            if not financials:
-                raise ValueError("No financials found for this organization")
-            
-            prompt = build_prompt_from_org_and_financials(org, financials)
-            
-            analysis = {
-                "readiness_score": 0.48,
-                "pushbacks": [
-                    {
-                        "title": "Why this team?",
-                        "points": [
-                            "CEO commitment is only 10 hrs/week",
-                            "CTO owns 65% equity"
-                        ]
-                    },
-                    {
-                        "title": "Who owns execution?",
-                        "points": [
-                            "No clear ownership of product delivery"
-                        ]
-                    }
-                ],
-                "fixes": [
-                    "Increase CEO time commitment",
-                    "Clarify ownership responsibilities",
-                    "Strengthen product roadmap"
-                ],
-                "demands": [
-                    {
-                        "label": "Equity Split",
-                        "value": "20%",
-                        "icon": "equity"
-                    },
-                    {
-                        "label": "Board Control",
-                        "value": "Quarterly Board Updates",
-                        "icon": "control"
-                    },
-                    {
-                        "label": "Milestone Metrics",
-                        "value": "Achieve MVP in 6 months",
-                        "icon": "milestones"
-                    }
-                ],
-                "simulated_reaction": [
-                    {"label": "Reject", "value": 70},
-                    {"label": "Soft Interest", "value": 20},
-                    {"label": "Fund", "value": 10}
-                ],
-                "investor_type": {
-                    "primary": "VC",
-                    "sectorFit": "Tech",
-                    "stageFit": "Seed",
-                    "mismatchFlags": ["Equity Disagreement", "Team Commitment"]
-                },
-                "recommendation": {
-                    "verdict": "Conditional",
-                    "reason": "Team alignment needs improvement before full funding"
-                },
-                "summary_insight": "The startup shows promise but needs better team alignment and clarity on execution ownership.",
-                "investor_mindset_quotes": [
-                    "I invest in people, not just ideas.",
-                    "Market traction is more important than a perfect plan.",
-                    "Equity and control always come first."
-                ],
-                "demand_warning": "High investor demands may delay fundraising.",
-                "next_action": {"label": "Improve Team Alignment", "targetScreen": "TeamAlignmentScreen"}
-            }
-
-
-            # -------------------------
-            # 🧠 Call the model here
-            # -------------------------
-            print("in investor readiness")
-            analysis = query_model(
-               prompt=prompt,
-               model="gemini-3-pro-preview"
-            )
+    insights = db.query(InvestorReadiness).filter_by(id=org_id).first()
+    if not insights:
+        insights = InvestorReadiness(id=org_id)
+        db.add(insights)
+
+    # Populate fields from the JSON data
+    insights.readiness_score = analysis.get("readiness_score", 0) * 100
+    insights.pushbacks = analysis.get("pushbacks", [])
+    insights.fixes = analysis.get("fixes", [])
+    insights.demands = analysis.get("demands", [])
+    insights.simulated_reaction = [
+        {"label": item["label"], "value": item["value"]} 
+        for item in analysis.get("simulated_reaction", [])
+    ]
+    insights.investor_type = analysis.get("investor_type", {})
+    insights.recommendation = analysis.get("recommendation", {})
+    insights.summary_insight = analysis.get("summary_insight", "")
+    insights.investor_mindset_quotes = analysis.get("investor_mindset_quotes", [])
+    insights.demand_warning = analysis.get("demand_warning", "")
+    insights.next_action = analysis.get("next_action", [])
 
-            # If your model returns a dict, use it directly
-            # Otherwise parse JSON here
-
-            # -------------------------
-            # 🔥 Save to DB
-            # -------------------------
-            
-            insights = db.query(InvestorReadiness).filter_by(id=org_id).first()
-            if not insights:
-                insights = InvestorReadiness(id=org_id)
-                db.add(insights)
-
-            # Populate fields from the JSON data
-            insights.readiness_score = analysis.get("readiness_score", 0) * 100
-            insights.pushbacks = analysis.get("pushbacks", [])
-            insights.fixes = analysis.get("fixes", [])
-            insights.demands = analysis.get("demands", [])
-            insights.simulated_reaction = [
-                {"label": item["label"], "value": item["value"]} 
-                for item in analysis.get("simulated_reaction", [])
-            ]
-            insights.investor_type = analysis.get("investor_type", {})
-            insights.recommendation = analysis.get("recommendation", {})
-            insights.summary_insight = analysis.get("summary_insight", "")
-            insights.investor_mindset_quotes = analysis.get("investor_mindset_quotes", [])
-            insights.demand_warning = analysis.get("demand_warning", "")
-            insights.next_action = analysis.get("next_action", [])
 
+    db.commit()
 
-            db.commit()
+    return {
+        "message": "Investor readiness analysis created/updated",
+        "org_id": org_id
+    }
 
-            # -------------------------
-            # 🟢 Call upsert_job for dashboard instead of queue
-            # -------------------------
-            upsert_job(db, org_id, "dashboard")
 
-            # Mark job as completed
-            job_status[job_id]["status"] = "COMPLETED"
-            job_status[job_id]["result"] = {
-                "message": "Investor readiness analysis created/updated",
-                "org_id": org_id
+# Model output for the dashboard, one object per section (see DASHBOARD_SECTIONS)
+SAMPLE_DASHBOARD = {
+    "thesis": {
+        "verdict": "High Potential, Early Risk",
+        "thesis": "The startup has a strong founding team with a clear market opportunity, but burn rate is high relative to runway.",
+        "capital_recommendation": "Consider a bridge round to extend runway while key hires are made."
+    },
+    "insight": {
+        "killer_insight": "Founders are highly aligned on vision, but key technical hires are missing, creating execution risk.",
+        "killer_insight_risk": "Execution Risk",
+        "killer_insight_confidence": 0.8
+    },
+    "actions": {
+        "top_actions": [
+            {
+                "title": "Hire Lead Engineer",
+                "why": "Critical technical capability gap that could delay product launch",
+                "risk": "High",
+                "screenId": "team_screen"
+            },
+            {
+                "title": "Reduce Monthly Burn",
+                "why": "Current burn rate risks running out of cash before revenue ramps",
+                "risk": "Medium",
+                "screenId": "financials_screen"
             }
+        ]
+    }
+}
 
-            # -------------------------
-            # 🗑 Delete job from DB
-            # -------------------------
-            try:
-                db.delete(job)
-                db.commit()
-            except Exception:
-                db.rollback()  # Ignore deletion failure
-
-
-        except Exception as e:
-            db.rollback()
-            if job:
-                job_status[job_id]["status"] = "FAILED"
-                job_status[job_id]["error"] = str(e)
-            print("investor readiness Exception:", str(e))
 
-        finally:
-            db.close()
-
-def dashboard_worker():
+def load_dashboard_inputs(db, org_id: str) -> dict:
     """
-    Worker function to process dashboard data.
+    Loads every upstream analysis for the org, as the JSON the dashboard
+    sections are built from.
     """
-    while True:
-        db = SessionLocal()
-        job = None
-
-        try:
-            # ✅ Pick the oldest pending job of type 'investor_readiness'
-            job = (
-                db.query(Job)
-                .filter(Job.type == "dashboard")
-                .order_by(asc(Job.created_time))
-                .first()
-            )
-
-            if not job:
-                time.sleep(1)  # No job, wait a bit
-                continue
-
-            org_id = job.org_id
-            job_id = job.id
-            job_status[job_id] = {"status": "RUNNING"}
+    org = db.query(OrgModel).filter_by(id=org_id).first()
+    if not org:
+        raise ValueError("No organization found for this ID")
 
-            # Process the job
-            org = db.query(OrgModel).filter_by(id=org_id).first()
-            if not org:
-                raise ValueError("No organization found for this ID")
+    financials = (
+        db.query(FinancialsModel)
+        .filter(FinancialsModel.org_id == org_id)
+        .first()
+    )
 
-            financials = (
-                db.query(FinancialsModel)
-                .filter(FinancialsModel.org_id == org_id)
-                .first()
-            )
+    members = db.query(OrgMemberModel).filter_by(org_id=org_id).all()
 
-            members = db.query(OrgMemberModel).filter_by(org_id=org_id).all()
-
-            alignments = db.query(FounderAlignmentModel).filter_by(org_id=org_id).first()
-
-           
-            ideaAnalysis = db.query(AIIdeaAnalysis).filter_by(workspace_id=org_id).first()
-
-            investorReadiness = db.query(InvestorReadiness).filter_by(id=org_id).first()
-
-
-            prompt = build_dashboard_prompt(org, financials, members, alignments, ideaAnalysis, investorReadiness)
-            
-            dashboard_data = {
-                "verdict": "High Potential, Early Risk",
-                "thesis": "The startup has a strong founding team with a clear market opportunity, but burn rate is high relative to runway.",
-                "killer_insight": "Founders are highly aligned on vision, but key technical hires are missing, creating execution risk.",
-                "killer_insight_risk": "Execution Risk",
-                "killer_insight_confidence": 0.8,
-                "runway_months": 6,
-                "burn_rate": 50000,
-                "capital_recommendation": "Consider a bridge round to extend runway while key hires are made.",
-                "top_actions": [
-                {
-                    "title": "Hire Lead Engineer",
-                    "why": "Critical technical capability gap that could delay product launch",
-                    "risk": "High",
-                    "screenId": "team_screen"
-                },
-                {
-                    "title": "Reduce Monthly Burn",
-                    "why": "Current burn rate risks running out of cash before revenue ramps",
-                    "risk": "Medium",
-                    "screenId": "financials_screen"
-                }
-            ],
-            "data_sources": [
-                "FinancialsModel",
-                "OrgMemberModel",
-                "FounderAlignmentModel",
-                "AIIdeaAnalysis",
-                "InvestorReadiness"
-            ],
-            "model_version": "v1"
-            }
+    alignments = db.query(FounderAlignmentModel).filter_by(org_id=org_id).first()
 
 
-            
+    ideaAnalysis = db.query(AIIdeaAnalysis).filter_by(workspace_id=org_id).first()
 
-            # -------------------------
-            # 🧠 Call the model here
-            # -------------------------
-            print("in dashboard")
-            dashboard_data = query_model(
-               prompt=prompt,
-               model="gemini-3-pro-preview"
-            )
+    investorReadiness = db.query(InvestorReadiness).filter_by(id=org_id).first()
 
-            # If your model returns a dict, use it directly
-            # Otherwise parse JSON here
-
-            # -------------------------
-            # 🔥 Save to DB
-            # -------------------------
-            
-            dashboard = db.query(DashboardModel).filter_by(id=org_id).first()
-            if not dashboard:
-                dashboard = DashboardModel(id=org_id)
-                db.add(dashboard)
-
-            dashboard.verdict = str(dashboard_data.get("verdict", ""))
-            dashboard.thesis = str(dashboard_data.get("thesis", ""))
-            dashboard.killer_insight = str(dashboard_data.get("killer_insight", ""))
-            dashboard.killer_insight_risk = str(dashboard_data.get("killer_insight_risk", "")) if dashboard_data.get("killer_insight_risk") else None
-            dashboard.killer_insight_confidence = float(dashboard_data.get("killer_insight_confidence", 0.0)) if dashboard_data.get("killer_insight_confidence") is not None else None
-            dashboard.runway_months = int(dashboard_data.get("runway_months")) if dashboard_data.get("runway_months") is not None else None
-            dashboard.burn_rate = float(dashboard_data.get("burn_rate")) if dashboard_data.get("burn_rate") is not None else None
-            dashboard.capital_recommendation = str(dashboard_data.get("capital_recommendation", "")) if dashboard_data.get("capital_recommendation") else None
-            dashboard.top_actions = dashboard_data.get("top_actions", [])
-            dashboard.data_sources = dashboard_data.get("data_sources", [])
-            dashboard.model_version = str(dashboard_data.get("model_version", "v1"))
+    sources = {
+        "FinancialsModel": financials,
+        "OrgMemberModel": members,
+        "FounderAlignmentModel": alignments,
+        "AIIdeaAnalysis": ideaAnalysis,
+        "InvestorReadiness": investorReadiness,
+    }
 
+    return {
+        "organization": build_organization_json(org),
+        "members": build_org_members_json(members),
+        "founder_alignment": build_founder_alignment_json(alignments),
+        "financials": build_financials_json(financials),
+        "idea_analysis": build_ai_idea_analysis_json(ideaAnalysis),
+        "investor_readiness": build_investor_readiness_json(investorReadiness),
+        "runway_distribution": build_runway_distribution_json(financials),
+        "data_sources": [name for name, row in sources.items() if row],
+    }
 
-            db.commit()
-            
-            # Mark job as completed
-            job_status[job_id]["status"] = "COMPLETED"
-            job_status[job_id]["result"] = {
-                "message": "Dashboard analysis created/updated",
-                "org_id": org_id
-            }
 
-            # -------------------------
-            # 🗑 Delete job from DB
-            # -------------------------
-            try:
-                db.delete(job)
-                db.commit()
-            except Exception:
-                db.rollback()  # Ignore deletion failure
+def prepare_dashboard(db, org_id: str) -> str:
+    """
+    The dashboard's inputs as JSON. Its prompt depends on which sections are
+    stale, so it is built later, by plan_dashboard.
+    """
+    return to_json(load_dashboard_inputs(db, org_id))
 
-        except Exception as e:
-            db.rollback()
-            if job:
-                job_status[job_id]["status"] = "FAILED"
-                job_status[job_id]["error"] = str(e)
-            print("Dashboard analysis Exception:", str(e))
 
-        finally:
-            db.close()
+def store_dashboard(db, org_id: str, dashboard_data: dict) -> dict:
+    """
+    Stores the synthesized dashboard for the org. Fields missing from
+    dashboard_data belong to sections that were not regenerated and keep
+    their stored values.
+    """
+    dashboard = db.query(DashboardModel).filter_by(id=org_id).first()
+    if not dashboard:
+        dashboard = DashboardModel(id=org_id)
+        db.add(dashboard)
+
+    def has(key):
+        return key in dashboard_data
+
+    if has("verdict"):
+        dashboard.verdict = str(dashboard_data.get("verdict", ""))
+    if has("thesis"):
+        dashboard.thesis = str(dashboard_data.get("thesis", ""))
+    if has("capital_recommendation") or has("thesis"):
+        dashboard.capital_recommendation = str(dashboard_data.get("capital_recommendation", "")) if dashboard_data.get("capital_recommendation") else None
+    if has("killer_insight"):
+        dashboard.killer_insight = str(dashboard_data.get("killer_insight", ""))
+        dashboard.killer_insight_risk = str(dashboard_data.get("killer_insight_risk", "")) if dashboard_data.get("killer_insight_risk") else None
+        dashboard.killer_insight_confidence = float(dashboard_data.get("killer_insight_confidence", 0.0)) if dashboard_data.get("killer_insight_confidence") is not None else None
+    if has("runway_months"):
+        dashboard.runway_months = int(dashboard_data.get("runway_months")) if dashboard_data.get("runway_months") is not None else None
+    if has("burn_rate"):
+        dashboard.burn_rate = float(dashboard_data.get("burn_rate")) if dashboard_data.get("burn_rate") is not None else None
+    if has("top_actions"):
+        dashboard.top_actions = dashboard_data.get("top_actions", [])
+    if has("data_sources"):
+        dashboard.data_sources = dashboard_data.get("data_sources", [])
+    if has("model_version"):
+        dashboard.model_version = str(dashboard_data.get("model_version", "v1"))
+    dashboard.last_computed_at = datetime.datetime.utcnow()
+
+
+    db.commit()
 
+    return {
+        "message": "Dashboard analysis created/updated",
+        "org_id": org_id
+    }
 
 
 def build_prompt_from_org_and_financials(org, financials):
     """
     Build a structured prompt for AI idea analysis from organization data.
     """
-
-    # --- Basic Org Info ---
-    startup_type = getattr(org, "type", None) or "Not specified"
-    problem_statement = getattr(org, "problem", None) or "Not specified"
-    solution_statement = getattr(org, "solution", None) or "Not specified"
-    
-    # Optional fields
-    name = getattr(org, "name", None) or "Not specified"
-    industry = getattr(org, "industry", None) or "Not specified"
-    geography = getattr(org, "geography", None) or "Not specified"
-    stage = getattr(org, "stage", None) or "Not specified"
-    customer = getattr(org, "customer", None) or "Not specified"
-
-    # Default values if not present
-    monthly_revenue = getattr(financials, "monthly_revenue", "Not specified")
-    revenue_trend = getattr(financials, "revenue_trend", "Not specified")
-    revenue_stage = getattr(financials, "revenue_stage", "Not specified")
-    expense_pattern = getattr(financials, "expense_pattern", "Not specified")
-    
-    cash_in_bank = getattr(financials, "cash_in_bank", "Not specified")
-    monthly_burn = getattr(financials, "monthly_burn", "Not specified")
-    cost_structure = getattr(financials, "cost_structure", "Not specified")
-    
-    pricing_model = getattr(financials, "pricing_model", "Not specified")
-    price_per_customer = getattr(financials, "price_per_customer", "Not specified")
-    customers_in_pipeline = getattr(financials, "customers_in_pipeline", "Not specified")
-    
-    data_confidence = getattr(financials, "data_confidence", "Rough")
+    startup = build_startup_details(org)
+    financial_details = {
+        "monthly_revenue": financials.monthly_revenue,
+        "revenue_trend": financials.revenue_trend,
+        "revenue_stage": financials.revenue_stage,
+        "cash_in_bank": financials.cash_in_bank,
+        "monthly_burn": financials.monthly_burn,
+        "fixed_expenses_percent": financials.expense_pattern,
+        "cost_structure": financials.cost_structure,
+        "pricing_model": financials.pricing_model,
+        "monthly_revenue_per_customer": financials.price_per_customer,
+        "customers_in_pipeline_per_month": financials.customers_in_pipeline,
+        "data_confidence": financials.data_confidence or "Rough",
+    }
 
     # --- Prompt Template ---
-    prompt = f"""
+    template = """
 You are an expert startup analyst with experience in venture capital and early-stage investments.
 
 Analyze the following startup information and produce a detailed investor insights report. Be opinionated, realistic, and precise.
 Judge financials based on the startup stage.
 
-Startup Details:
-- Startup Name: {name}
-- Industry: {industry}
-- Geography: {geography}
-- Stage: {stage}
-- Customer: {customer}
-- Startup Field: {startup_type}
-- Problem Statement: {problem_statement}
-- Solution by Startup: {solution_statement}
-
-Financial Details:
-- Current Monthly Revenue: {monthly_revenue}
-- Revenue Trend: {revenue_trend}
-- Revenue Stage: {revenue_stage}
-- Estimated Cash in Bank: {cash_in_bank}
-- Estimated Monthly Burn: {monthly_burn}
-- Expenses fixedness (in percentage): {expense_pattern}
-- Estimated Cost Structure: {cost_structure}
-- Estimated Pricing Model: {pricing_model}
-- Estimated Monthly revenue per Customer: {price_per_customer}
-- Estimated Customers in Pipeline per month: {customers_in_pipeline}
-- Data Confidence: {data_confidence}
+Startup Details (JSON, unspecified fields are left out):
+{startup}
+
+Financial Details (estimates where noted by data_confidence):
+{financials}
 
 Output your analysis strictly as **JSON** matching this TypeScript interface:
 
@@ -1016,7 +1004,24 @@ Guidelines:
 Make sure the JSON is **fully valid** and ready to use in TypeScript.
 """
 
-    return prompt
+    return render_prompt(
+        template,
+        settings.PROMPT_TOKEN_BUDGET["investor_readiness"],
+        startup=startup,
+        financials=financial_details
+    )
+
+def build_startup_details(org: OrgModel):
+    return {
+        "name": org.name,
+        "industry": org.industry,
+        "geography": org.geography,
+        "stage": org.stage,
+        "customer": org.customer,
+        "field": org.type,
+        "problem": org.problem,
+        "solution": org.solution
+    }
 
 def build_organization_json(org: OrgModel):
     return {
@@ -1119,88 +1124,898 @@ def build_investor_readiness_json(ir: InvestorReadiness):
     }
 
 
-def build_dashboard_prompt(org, financials, founders, alignments, ideaAnalysis, investorReadiness):
-    """
-    dashboard: DashboardModel
-    returns: string prompt
-    """
-    organization_json = build_organization_json(org)
-    org_members_json = build_org_members_json(founders)
-    founder_alignment_json = build_founder_alignment_json(alignments)
-    financials_json = build_financials_json(financials)
-    ai_idea_analysis_json = build_ai_idea_analysis_json(ideaAnalysis)
-    investor_readiness_json = build_investor_readiness_json(investorReadiness)
-    
-    prompt = f"""
-You are a senior startup investor and operating partner.
+def build_runway_distribution_json(fin: FinancialsModel):
+    try:
+        distribution = simulate_runway(fin)
+    except ValueError:
+        return None  # No cash or burn figures to simulate from
+    return {
+        "runway_months_percentiles": distribution["runway_months"],
+        "out_of_cash_probability_within_months": distribution["out_of_cash_probability"],
+        "horizon_months": distribution["horizon_months"],
+    }
 
-Your job is to synthesize multiple analyses into a single executive dashboard.
-Be decisive, opinionated, and concise. Avoid generic advice.
 
-INPUT DATA:
+def compute_dashboard_metrics(inputs: dict) -> dict:
+    """
+    Runway and burn, straight from the financials.
+    """
+    financials = inputs.get("financials") or {}
+    burn = financials.get("monthly_burn")
+    cash = financials.get("cash_in_bank")
 
-Organization:
-{organization_json}
+    return {
+        "runway_months": int(cash // burn) if cash is not None and burn else None,
+        "burn_rate": burn,
+        "data_sources": inputs.get("data_sources", []),
+        "model_version": "v1",
+    }
 
-Founders & Team:
-{org_members_json}
 
-Founder Alignment Analysis:
-{founder_alignment_json}
+# The dashboard in sections, each with the inputs it is built from. After an
+# upstream change only the model sections reading it are regenerated.
+DASHBOARD_SECTIONS = [
+    Section(
+        name="metrics",
+        inputs=("financials", "data_sources"),
+        compute=compute_dashboard_metrics
+    ),
+    Section(
+        name="thesis",
+        inputs=("organization", "financials", "runway_distribution", "idea_analysis", "investor_readiness"),
+        schema=DashboardThesisSection,
+        task="verdict (ONE sharp phrase), thesis (1-2 sentences max) and capital_recommendation "
+             "(how much to raise or cut, and when)."
+    ),
+    Section(
+        name="insight",
+        inputs=("members", "founder_alignment", "financials", "runway_distribution", "investor_readiness"),
+        schema=DashboardInsightSection,
+        task="killer_insight: a non-obvious risk or leverage point; killer_insight_risk: its category "
+             "(e.g. Founder Risk, Capital Risk, Market Risk); killer_insight_confidence: 0.0-1.0, "
+             "reflecting how consistent the data is."
+    ),
+    Section(
+        name="actions",
+        inputs=("founder_alignment", "financials", "idea_analysis", "investor_readiness"),
+        schema=DashboardActionsSection,
+        task="top_actions: 2-4 actions, each with title, why, risk (High, Medium or Low) and the "
+             "screenId of the relevant screen."
+    ),
+]
+
+
+DASHBOARD_TEMPLATE = """
+You are a senior startup investor and operating partner.
 
-Financials:
-{financials_json}
+Your job is to synthesize multiple analyses into a single executive dashboard.
+Be decisive, opinionated, and concise. Avoid generic advice.
 
-AI Market & Idea Analysis:
-{ai_idea_analysis_json}
+INPUT DATA (JSON, empty fields are left out):
+{inputs}
 
-Investor Readiness Analysis:
-{investor_readiness_json}
+runway_distribution, when present, comes from a Monte Carlo simulation of the
+financials: runway percentiles in months (capped at horizon_months) and the
+probability of running out of cash within each number of months. Base any
+runway or fundraising judgement on it rather than on a single estimate.
 
 ---
 
 TASK:
-Generate a SINGLE executive dashboard object using the schema below.
+Write the following dashboard sections, each as an object under its name:
+
+{tasks}
 
 RULES:
-- Verdict must be ONE sharp phrase
-- Thesis must be 1–2 sentences max
-- Killer Insight must reveal a non-obvious risk or leverage point
-- Confidence should reflect data consistency (0.0–1.0)
-- Actions must reference the relevant screenId
 - Do NOT repeat raw data
 - Think like an investor deciding whether to take the meeting
-- If any output field data is missing, return null or empty list for that field
+- If data for a field is missing, return null or an empty list for it
 
-OUTPUT FORMAT (JSON ONLY):
-
-{{
-  "verdict": "",
-  "thesis": "",
-  "killer_insight": "",
-  "killer_insight_risk": "",
-  "killer_insight_confidence": 0.0,
-  "runway_months": null,
-  "burn_rate": null,
-  "capital_recommendation": "",
-  "top_actions": [
-    {{
-      "title": "",
-      "why": "",
-      "risk": "",
-      "screenId": ""
-    }}
-  ],
-  "data_sources": [],
-  "model_version": "v1"
-}}
+Return JSON ONLY.
 """
-    print(f"Processing  data for job ")
-    return prompt
 
-def start_workers():
-    
-    threading.Thread(target=founder_alignment_worker, daemon=True).start()
-    threading.Thread(target=idea_analysis_worker, daemon=True).start()
-    threading.Thread(target=investor_readiness_worker, daemon=True).start()
-    threading.Thread(target=dashboard_worker, daemon=True).start()
+
+def plan_dashboard(source: str, dashboard: DashboardModel | None, force: bool) -> SectionPlan:
+    """
+    Computes the local dashboard sections and the prompt for the model
+    sections whose inputs changed. source is the output of prepare_dashboard.
+    """
+    return plan_sections(
+        DASHBOARD_SECTIONS,
+        json.loads(source),
+        dashboard.section_fingerprints if dashboard is not None else None,
+        force,
+        DASHBOARD_TEMPLATE,
+        settings.PROMPT_TOKEN_BUDGET["dashboard"]
+    )
+
+@dataclass
+class JobSpec:
+    """
+    How a job type is executed: load inputs and build the prompt, call the
+    model, then store the parsed result. The model is picked per job by
+    model_router.
+    """
+    prepare: Callable[[Session, str], str]
+    store: Callable[[Session, str, dict], dict]
+    # Job types whose results feed this one. A job waits while any of them
+    # is still queued or running for the same org.
+    upstream: tuple[str, ...] = ()
+    # Result table and the column holding the org id, used to read and write
+    # the input fingerprint of the stored result
+    result_table: Any = None
+    result_key: str = "id"
+    # Shape of the model's JSON output
+    output_schema: type[BaseModel] | None = None
+    # For results split into sections: given the prepared inputs, the stored
+    # result and whether to regenerate everything, decides what the model
+    # writes (see sections.plan_sections)
+    plan: Callable[[str, Any, bool], SectionPlan] | None = None
+
+
+JOB_SPECS = {
+    "founder_alignment": JobSpec(
+        prepare=prepare_founder_alignment,
+        store=store_founder_alignment,
+        result_table=FounderAlignmentModel,
+        result_key="org_id",
+        output_schema=FounderAlignmentPayload
+    ),
+    "idea_analysis": JobSpec(
+        prepare=prepare_idea_analysis,
+        store=store_idea_analysis,
+        result_table=AIIdeaAnalysis,
+        result_key="workspace_id",
+        output_schema=AnalysisPayload
+    ),
+    "investor_readiness": JobSpec(
+        prepare=prepare_investor_readiness,
+        store=store_investor_readiness,
+        result_table=InvestorReadiness,
+        output_schema=InvestorReadinessPayload
+    ),
+    "dashboard": JobSpec(
+        prepare=prepare_dashboard,
+        store=store_dashboard,
+        upstream=("founder_alignment", "idea_analysis", "investor_readiness"),
+        result_table=DashboardModel,
+        plan=plan_dashboard
+    ),
+}
+
+
+# Canned answers for LLM_PROVIDER=mock: the first phrase found in the prompt
+# picks the payload, the idea analysis is the fallback
+MOCK_RESPONSES = [
+    ("single executive dashboard", SAMPLE_DASHBOARD),
+    ("investor insights report", SAMPLE_INVESTOR_READINESS),
+    ("Analyze founder alignment", SAMPLE_FOUNDER_ALIGNMENT),
+    ("", SAMPLE_IDEA_ANALYSIS),
+]
+
+provider = create_provider(MOCK_RESPONSES)
+
+
+@dataclass
+class PreparedJob:
+    org_id: str
+    # None when the result is computed without a model call
+    prompt: str | None
+    use_cache: bool
+    fingerprint: str
+    model: str
+    priority: str = "normal"
+    schema: type[BaseModel] | None = None
+    plan: SectionPlan | None = None
+    # Prompt and response token counts, filled in by the model call
+    usage: dict = field(default_factory=dict)
+
+
+def input_fingerprint(model: str, prompt: str) -> str:
+    """
+    Hash of everything a result is built from. The prompt is rendered from
+    exactly the fields each analysis reads, so writes that touch none of them
+    (onboarding steps, identical re-saves) leave it unchanged.
+    """
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+def _result_row(db, spec: JobSpec, org_id: str):
+    column = getattr(spec.result_table, spec.result_key)
+    return db.query(spec.result_table).filter(column == org_id).first()
+
+
+def _start_job(job_id: str, job_type: str) -> PreparedJob | None:
+    """
+    Marks the job as running and builds its prompt.
+    Returns None when there is nothing to run: the job has been superseded,
+    or its inputs match the ones the stored result was built from.
+    """
+    db = SessionLocal()
+    try:
+        job = db.query(Job).filter_by(id=job_id).first()
+        if not job or job.claimed_by != WORKER_ID:
+            # Superseded by a newer upsert_job, or our lease was taken over
+            return None
+
+        spec = JOB_SPECS[job_type]
+        org_id = job.org_id
+        record_job_status(
+            db, job_id, "RUNNING", org_id=org_id, job_type=job_type,
+            started_at=datetime.datetime.utcnow(), attempts=job.attempts
+        )
+        event_bus.publish(org_id, job_type, "running", job_id=job_id)
+        prompt = spec.prepare(db, org_id)
+        # Keyed on the tier's model, so a fallback answer is not redone
+        # just because the primary model is healthy again
+        fingerprint = input_fingerprint(primary_model(job_type), prompt)
+        use_cache = not job.bypass_cache
+
+        result = _result_row(db, spec, org_id)
+        if use_cache and result is not None and result.input_fingerprint == fingerprint:
+            # Nothing relevant changed: finish as a no-op, without a model
+            # call and without re-queueing downstream jobs
+            unchanged = {"message": "Inputs unchanged", "org_id": org_id}
+            record_job_status(db, job_id, "COMPLETED", result=unchanged, finished_at=datetime.datetime.utcnow())
+            event_bus.publish(org_id, job_type, "completed", job_id=job_id, result=unchanged)
+            complete_job(db, job_id, WORKER_ID)
+            return None
+
+        schema, plan = spec.output_schema, None
+        if spec.plan is not None:
+            plan = spec.plan(prompt, result, not use_cache)
+            prompt, schema = plan.prompt, plan.schema
+
+        return PreparedJob(
+            org_id=org_id,
+            prompt=prompt,
+            use_cache=use_cache,
+            fingerprint=fingerprint,
+            model=route(job_type, priority_name(job.priority)),
+            priority=priority_name(job.priority),
+            schema=schema,
+            plan=plan
+        )
+    finally:
+        db.close()
+
+
+def _finish_job(job_id: str, job_type: str, prepared: PreparedJob, analysis: dict):
+    """
+    Stores the model output and removes the job from the jobs table, or
+    queues it again if it was updated while running.
+    """
+    spec = JOB_SPECS[job_type]
+    db = SessionLocal()
+    try:
+        if prepared.plan is not None:
+            analysis = prepared.plan.result(analysis)
+        result = spec.store(db, prepared.org_id, analysis)
+        event_bus.publish(prepared.org_id, job_type, "updated", table=spec.result_table.__tablename__)
+
+        row = _result_row(db, spec, prepared.org_id)
+        if row is not None:
+            row.input_fingerprint = prepared.fingerprint
+            if prepared.plan is not None:
+                row.section_fingerprints = {**(row.section_fingerprints or {}), **prepared.plan.fingerprints}
+            db.commit()
+
+        # -------------------------
+        # 🟢 Queue the jobs built on this result, e.g. the dashboard,
+        # at the same priority
+        # -------------------------
+        for downstream_type, downstream in JOB_SPECS.items():
+            if job_type in downstream.upstream:
+                upsert_job(db, prepared.org_id, downstream_type, priority=prepared.priority)
+
+        # Mark job as completed
+        record_job_status(
+            db, job_id, "COMPLETED", result=result, error=None, finished_at=datetime.datetime.utcnow(),
+            model=prepared.model,
+            prompt_tokens=prepared.usage.get("prompt_tokens"),
+            response_tokens=prepared.usage.get("response_tokens")
+        )
+        event_bus.publish(prepared.org_id, job_type, "completed", job_id=job_id, result=result)
+
+        # -------------------------
+        # 🗑 Delete job from DB (or queue its re-run)
+        # -------------------------
+        try:
+            complete_job(db, job_id, WORKER_ID)
+        except Exception:
+            db.rollback()  # Ignore deletion failure
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _fail_job(job_id: str, job_type: str, e: Exception):
+    """
+    Releases the lease so the job is retried after a backoff (status
+    RETRYING), or drops the job once it has used up its attempts (FAILED).
+    A job updated while running is not retried: its re-run, with fresh
+    attempts, is queued instead.
+    """
+    print(f"{job_type} Exception:", str(e))
+
+    db = SessionLocal()
+    try:
+        job = db.query(Job).filter_by(id=job_id, claimed_by=WORKER_ID).first()
+        if job is None:
+            # Superseded meanwhile, or our lease was taken over
+            record_job_status(db, job_id, "FAILED", error=str(e), finished_at=datetime.datetime.utcnow())
+            return
+
+        gave_up = (job.attempts or 0) >= settings.JOB_MAX_ATTEMPTS
+        retrying = not gave_up and not job.rerun_requested
+        event_bus.publish(job.org_id, job_type, "failed", job_id=job_id, error=str(e), retrying=retrying)
+
+        if not retrying:
+            if gave_up:
+                print(f"{job_type} job {job_id} gave up after {job.attempts} attempts")
+            record_job_status(db, job_id, "FAILED", error=str(e), finished_at=datetime.datetime.utcnow())
+            complete_job(db, job_id, WORKER_ID)
+        else:
+            retry_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=retry_delay_seconds(job.attempts or 1))
+            record_job_status(db, job_id, "RETRYING", error=str(e))
+            release_job(db, job_id, WORKER_ID, retry_at=retry_at)
+    except Exception:
+        db.rollback()
+    finally:
+        db.close()
+
+
+def _partial_publisher(job_id: str, job_type: str, org_id: str) -> Callable[[str], None] | None:
+    """
+    Streams the model output only while someone is listening for it;
+    otherwise the plain, non-streaming call is used.
+
+    Each partial event carries only the text added since the previous one,
+    as text, with offset the position it starts at (0 again after a retry
+    started the output over). Events are at most one per
+    EVENT_PARTIAL_MIN_INTERVAL_SECONDS; the completed event has the result.
+    """
+    if not event_bus.has_subscribers(org_id, job_type):
+        return None
+
+    published = ""
+    last_sent = 0.0
+
+    def publish(text: str):
+        nonlocal published, last_sent
+        now = time.monotonic()
+        if now - last_sent < settings.EVENT_PARTIAL_MIN_INTERVAL_SECONDS:
+            return
+        offset = len(published) if text.startswith(published) else 0
+        if offset == len(text):
+            return
+        event_bus.publish(org_id, job_type, "partial", job_id=job_id, offset=offset, text=text[offset:])
+        published = text
+        last_sent = now
+
+    return publish
+
+
+def run_job(job_id: str, job_type: str) -> bool:
+    """
+    Executes one job on the calling thread.
+    Returns False when the job failed and was left in place for a retry.
+    """
+    started = time.perf_counter()
+    try:
+        prepared = _start_job(job_id, job_type)
+        if prepared is None:
+            return True
+
+        analysis = {}
+        if prepared.prompt is not None:
+            print(f"in {job_type} on {prepared.model}")
+            analysis = query_model(
+                prompt=prepared.prompt,
+                model=prepared.model,
+                use_cache=prepared.use_cache,
+                on_partial=_partial_publisher(job_id, job_type, prepared.org_id),
+                usage=prepared.usage,
+                schema=prepared.schema
+            )
+
+        _finish_job(job_id, job_type, prepared, analysis)
+        metrics.job_duration.observe(time.perf_counter() - started, type=job_type, outcome="completed")
+        return True
+
+    except Exception as e:
+        _fail_job(job_id, job_type, e)
+        metrics.job_duration.observe(time.perf_counter() - started, type=job_type, outcome="failed")
+        return False
+
+
+def run_batch(job_ids: list[str], job_type: str) -> int:
+    """
+    Executes jobs of one type as provider batches, one per output schema, on
+    the calling thread. Returns how many succeeded; failed jobs are left for
+    a retry.
+    """
+    started = time.perf_counter()
+    prepared = {}
+    for job_id in job_ids:
+        try:
+            job = _start_job(job_id, job_type)
+        except Exception as e:
+            _fail_job(job_id, job_type, e)
+            continue
+        if job is not None:
+            prepared[job_id] = job
+
+    results = {}
+    groups = {}
+    for job_id, job in prepared.items():
+        if job.prompt is None:
+            results[job_id] = {}  # Nothing for the model to write
+        else:
+            groups.setdefault(job.schema, []).append(job_id)
+
+    for schema, batch_ids in groups.items():
+        try:
+            batch_results = query_model_batch(
+                prompts=[prepared[job_id].prompt for job_id in batch_ids],
+                model=primary_model(job_type),
+                use_cache=[prepared[job_id].use_cache for job_id in batch_ids],
+                usages=[prepared[job_id].usage for job_id in batch_ids],
+                schema=schema
+            )
+        except Exception as e:
+            batch_results = [e] * len(batch_ids)
+        results.update(zip(batch_ids, batch_results))
+
+    succeeded = 0
+    for job_id, result in results.items():
+        try:
+            if isinstance(result, Exception):
+                raise result
+            _finish_job(job_id, job_type, prepared[job_id], result)
+            succeeded += 1
+            outcome = "completed"
+        except Exception as e:
+            _fail_job(job_id, job_type, e)
+            outcome = "failed"
+        # Every job in the batch waited for the whole batch
+        metrics.job_duration.observe(time.perf_counter() - started, type=job_type, outcome=outcome)
+
+    return succeeded
+
+
+class AsyncJobRunner:
+    """
+    Runs jobs on a private asyncio event loop.
+
+    Model calls are awaited through query_model_async, with a semaphore
+    capping how many are in flight, so hundreds of pending Gemini requests
+    cost coroutines rather than threads. The short database phases before
+    and after the call run on a small thread pool.
+    """
+
+    def __init__(self, max_in_flight: int, db_threads: int):
+        self.max_in_flight = max_in_flight
+        self._db_pool = ThreadPoolExecutor(max_workers=db_threads, thread_name_prefix="foundry-db")
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    def start(self):
+        threading.Thread(target=self._run_loop, name="foundry-async-runner", daemon=True).start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def submit(self, job_id: str, job_type: str) -> Future:
+        """
+        Schedules a job from any thread and returns a concurrent Future.
+        """
+        return asyncio.run_coroutine_threadsafe(self.run_job(job_id, job_type), self._loop)
+
+    async def run_job(self, job_id: str, job_type: str) -> bool:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+
+        try:
+            prepared = await loop.run_in_executor(self._db_pool, _start_job, job_id, job_type)
+            if prepared is None:
+                return True
+
+            analysis = {}
+            if prepared.prompt is not None:
+                print(f"in {job_type} on {prepared.model}")
+                async with self._semaphore:
+                    analysis = await query_model_async(
+                        prompt=prepared.prompt,
+                        model=prepared.model,
+                        use_cache=prepared.use_cache,
+                        on_partial=_partial_publisher(job_id, job_type, prepared.org_id),
+                        usage=prepared.usage,
+                        schema=prepared.schema
+                    )
+
+            await loop.run_in_executor(self._db_pool, _finish_job, job_id, job_type, prepared, analysis)
+            metrics.job_duration.observe(time.perf_counter() - started, type=job_type, outcome="completed")
+            return True
+
+        except Exception as e:
+            await loop.run_in_executor(self._db_pool, _fail_job, job_id, job_type, e)
+            metrics.job_duration.observe(time.perf_counter() - started, type=job_type, outcome="failed")
+            return False
+
+
+def _priority_level(job: Job) -> int:
+    # Rows queued before the priority column existed count as normal
+    return job.priority if job.priority is not None else JOB_PRIORITIES["normal"]
+
+
+class WorkerScheduler:
+    """
+    Single scheduler thread feeding a bounded pool of worker threads, or an
+    AsyncJobRunner when one is given.
+
+    Each job type may run up to its configured number of jobs at once, and
+    no more than max_workers jobs are in flight overall. An org never has two
+    jobs of the same type in flight, so a re-queued job waits for the current
+    run.
+
+    poll_interval is for schedulers that may not hear other processes' jobs
+    being queued: while no cross-process event broker is reachable, the jobs
+    table is re-checked at least this often.
+    """
+
+    def __init__(self, concurrency: dict, max_workers: int, runner: AsyncJobRunner | None = None,
+                 poll_interval: float | None = None):
+        self.concurrency = concurrency
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        if runner is None:
+            pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="foundry-worker")
+            self._submit = lambda job_id, job_type: pool.submit(run_job, job_id, job_type)
+        else:
+            self._submit = runner.submit
+        self._lock = threading.Lock()
+        # job_type -> {org_id: job_id}
+        self._in_flight = {job_type: {} for job_type in concurrency}
+        self._next_prune = 0.0
+        # job_type -> {org_id: job_id} for jobs running inside a provider batch
+        self._batched = {job_type: {} for job_type in concurrency}
+        self._batches_running = 0
+        self._batch_pool = ThreadPoolExecutor(
+            max_workers=settings.LLM_BATCH_MAX_CONCURRENT, thread_name_prefix="foundry-batch"
+        )
+        # org_id -> dispatch counter value when it last got a job started
+        self._last_served = {}
+        self._serve_count = 0
+
+    def _in_flight_total(self) -> int:
+        return sum(len(jobs) for jobs in self._in_flight.values())
+
+    def _ready_jobs(self, db: Session, job_type: str, now: datetime.datetime,
+                    priority: str | None = None, limit: int | None = None) -> list[Job]:
+        """
+        Jobs of one type that could start now, most urgent and oldest first.
+        """
+        with self._lock:
+            busy_orgs = set(self._in_flight[job_type]) | set(self._batched[job_type])
+
+        query = db.query(Job).filter(
+            Job.type == job_type,
+            or_(Job.not_before.is_(None), Job.not_before <= now),
+            claimable_job_filter(now),
+            func.coalesce(Job.attempts, 0) < settings.JOB_MAX_ATTEMPTS
+        )
+        if busy_orgs:
+            query = query.filter(Job.org_id.notin_(busy_orgs))
+
+        upstream = JOB_SPECS[job_type].upstream
+        if upstream:
+            pending_upstream = aliased(Job)
+            query = query.filter(
+                ~exists().where(
+                    pending_upstream.org_id == Job.org_id,
+                    pending_upstream.type.in_(upstream)
+                )
+            )
+
+        level = func.coalesce(Job.priority, JOB_PRIORITIES["normal"])
+        if priority:
+            query = query.filter(level == JOB_PRIORITIES[priority])
+        return query.order_by(asc(level), asc(Job.created_time)).limit(limit or self.concurrency[job_type]).all()
+
+    def _fair_order(self, jobs: list[Job]) -> list[Job]:
+        """
+        Orders jobs by priority and, within a priority, takes one job per
+        org in turns, starting with the org that was served least recently.
+        """
+        ordered = []
+        levels = sorted({_priority_level(job) for job in jobs})
+
+        for level in levels:
+            by_org = {}
+            for job in sorted(jobs, key=lambda j: j.created_time or datetime.datetime.min):
+                if _priority_level(job) == level:
+                    by_org.setdefault(job.org_id, []).append(job)
+
+            orgs = sorted(by_org, key=lambda org_id: self._last_served.get(org_id, 0))
+            while orgs:
+                for org_id in orgs:
+                    ordered.append(by_org[org_id].pop(0))
+                orgs = [org_id for org_id in orgs if by_org[org_id]]
+
+        return ordered
+
+    def _has_slot(self, job: Job) -> bool:
+        """
+        Whether the type and global limits leave room for the job. Jobs that
+        are not interactive stay out of the reserved slots.
+        """
+        reserved = 0
+        if _priority_level(job) > JOB_PRIORITIES["interactive"]:
+            reserved = settings.WORKER_INTERACTIVE_RESERVED_SLOTS
+
+        limit = self.concurrency[job.type]
+        with self._lock:
+            if job.org_id in self._in_flight[job.type]:
+                return False
+            return (
+                len(self._in_flight[job.type]) < max(limit - reserved, 1)
+                and self._in_flight_total() < max(self.max_workers - reserved, 1)
+            )
+
+    def dispatch_ready_jobs(self) -> int:
+        """
+        Submits as many pending jobs as the limits allow. Returns the count.
+
+        Interactive jobs go before normal ones, and normal before background.
+        Orgs with jobs at the same priority take turns, so one busy org or a
+        bulk backfill cannot hold up everybody else.
+        """
+        submitted = 0
+        now = datetime.datetime.utcnow()
+        db = SessionLocal()
+
+        try:
+            if settings.LLM_BATCH_ENABLED:
+                for job_type in self.concurrency:
+                    submitted += self._dispatch_batch(db, job_type, now)
+
+            jobs = []
+            for job_type in self.concurrency:
+                jobs.extend(self._ready_jobs(db, job_type, now))
+
+            for job in self._fair_order(jobs):
+                if not self._has_slot(job):
+                    continue
+
+                # Another worker process may have claimed it meanwhile
+                if not claim_job(db, job.id, WORKER_ID, settings.JOB_LEASE_SECONDS):
+                    continue
+
+                with self._lock:
+                    self._in_flight[job.type][job.org_id] = job.id
+                self._serve_count += 1
+                self._last_served[job.org_id] = self._serve_count
+
+                future = self._submit(job.id, job.type)
+                future.add_done_callback(partial(self._job_done, job.type, job.org_id))
+                submitted += 1
+        finally:
+            db.close()
+
+        if len(self._last_served) > 10000:
+            # Forget the orgs served longest ago; they simply rank first again
+            recent = sorted(self._last_served.items(), key=lambda item: item[1])[-5000:]
+            self._last_served = dict(recent)
+
+        return submitted
+
+    def _dispatch_batch(self, db: Session, job_type: str, now: datetime.datetime) -> int:
+        """
+        Claims ready background jobs of one type and runs them as a single
+        provider batch, once there are at least LLM_BATCH_MIN_SIZE of them.
+        Batches run beside the worker pool and do not use its slots.
+        """
+        with self._lock:
+            if self._batches_running >= settings.LLM_BATCH_MAX_CONCURRENT:
+                return 0
+
+        jobs = self._ready_jobs(db, job_type, now, priority="background", limit=settings.LLM_BATCH_MAX_SIZE)
+        if len(jobs) < settings.LLM_BATCH_MIN_SIZE:
+            return 0
+
+        claimed = [job for job in jobs if claim_job(db, job.id, WORKER_ID, settings.JOB_LEASE_SECONDS)]
+        if not claimed:
+            return 0
+
+        with self._lock:
+            self._batches_running += 1
+            for job in claimed:
+                self._batched[job_type][job.org_id] = job.id
+
+        future = self._batch_pool.submit(run_batch, [job.id for job in claimed], job_type)
+        future.add_done_callback(partial(self._batch_done, job_type, [job.org_id for job in claimed]))
+        print(f"Submitted {job_type} batch of {len(claimed)} jobs")
+        return len(claimed)
+
+    def _batch_done(self, job_type: str, org_ids: list[str], future: Future):
+        with self._lock:
+            self._batches_running -= 1
+            for org_id in org_ids:
+                self._batched[job_type].pop(org_id, None)
+        dispatcher.notify()
+
+    def renew_leases(self):
+        with self._lock:
+            job_ids = [
+                job_id
+                for jobs in list(self._in_flight.values()) + list(self._batched.values())
+                for job_id in jobs.values()
+            ]
+
+        db = SessionLocal()
+        try:
+            renew_leases(db, job_ids, WORKER_ID, settings.JOB_LEASE_SECONDS)
+        finally:
+            db.close()
+
+    def seconds_until_next_job(self) -> float | None:
+        """
+        Time until the earliest job still inside its coalescing window becomes
+        eligible, or None when there is none.
+        """
+        db = SessionLocal()
+        try:
+            next_due = db.query(func.min(Job.not_before)).filter(
+                Job.not_before > datetime.datetime.utcnow()
+            ).scalar()
+        finally:
+            db.close()
+
+        if next_due is None:
+            return None
+        return max((next_due - datetime.datetime.utcnow()).total_seconds(), 0.0)
+
+    def _job_done(self, job_type: str, org_id: str, future: Future):
+        with self._lock:
+            self._in_flight[job_type].pop(org_id, None)
+
+        # A slot just opened up, whether the job succeeded or failed
+        dispatcher.notify()
+
+    def expire_exhausted_jobs(self):
+        db = SessionLocal()
+        try:
+            expire_exhausted_jobs(db)
+        finally:
+            db.close()
+
+    def prune_job_status(self):
+        """
+        Trims the job status table, at most once per cleanup interval.
+        """
+        if time.monotonic() < self._next_prune:
+            return
+        self._next_prune = time.monotonic() + settings.JOB_STATUS_CLEANUP_INTERVAL_SECONDS
+
+        db = SessionLocal()
+        try:
+            removed = prune_job_status(db)
+            if removed:
+                print(f"Pruned {removed} job status rows")
+        finally:
+            db.close()
+
+    def run_forever(self):
+        while True:
+            timeout = None
+            try:
+                self.renew_leases()
+                self.expire_exhausted_jobs()
+                self.dispatch_ready_jobs()
+                self.prune_job_status()
+                timeout = self.seconds_until_next_job()
+            except Exception as e:
+                print("Scheduler Exception:", str(e))
+
+            sweep = settings.JOB_SWEEP_INTERVAL_SECONDS
+            if self.poll_interval is not None and not event_bus.cross_process:
+                sweep = min(sweep, self.poll_interval)
+            if timeout is not None:
+                sweep = min(timeout, sweep)
+            dispatcher.wait(sweep)
+
+
+scheduler = None
+
+
+def _wake_on_queued(message: dict):
+    # Jobs queued by any process, delivered through the event broker
+    if message.get("event") == "queued":
+        dispatcher.notify()
+
+
+def start_workers(poll_interval: float | None = None):
+    global scheduler
+
+    # Build the shared Gemini client and open its connection up front
+    threading.Thread(
+        target=provider.warm, args=(settings.LLM_MODELS["pro"],),
+        name="foundry-llm-warmup", daemon=True
+    ).start()
+
+    runner = None
+    if settings.WORKER_EXECUTION_MODE == "async":
+        runner = AsyncJobRunner(
+            max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+            db_threads=settings.ASYNC_DB_THREADS
+        )
+        runner.start()
+
+    scheduler = WorkerScheduler(
+        concurrency=settings.WORKER_CONCURRENCY,
+        max_workers=settings.WORKER_MAX_CONCURRENCY,
+        runner=runner,
+        poll_interval=poll_interval
+    )
+    event_bus.add_listener(_wake_on_queued)
+    threading.Thread(target=scheduler.run_forever, name="foundry-scheduler", daemon=True).start()
+
+
+def run_worker_process(sweep_interval: float, processes: int = 1):
+    # The rate limiter is per process; share the quota between the workers
+    limiter.set_quota(
+        settings.LLM_REQUESTS_PER_MINUTE / processes,
+        settings.LLM_TOKENS_PER_MINUTE / processes
+    )
+    start_workers(poll_interval=sweep_interval)
+    # The scheduler and pool threads are daemons; keep the process alive
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Foundry job workers outside the API process.")
+    parser.add_argument("--processes", type=int, default=settings.WORKER_PROCESSES,
+                        help="number of worker processes, each with its own scheduler and pool")
+    parser.add_argument("--sweep-interval", type=float, default=settings.WORKER_SWEEP_INTERVAL_SECONDS,
+                        help="seconds between checks of the jobs table while no cross-process "
+                             "event broker is reachable")
+    args = parser.parse_args()
+
+    settings.validate()
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+
+    if args.processes <= 1:
+        run_worker_process(args.sweep_interval)
+        return
+
+    # spawn rather than fork so every process gets its own WORKER_ID,
+    # engine and Gemini client
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=run_worker_process, args=(args.sweep_interval, args.processes), name=f"foundry-worker-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    print(f"Started {len(processes)} worker processes")
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()